@@ -0,0 +1,106 @@
+import streamlit as st
+
+import adl_analysis
+import figures
+import scoring
+import shared
+import snapshot
+import store
+
+# --- 1. PAGE CONFIGURATION ---
+st.set_page_config(
+    page_title="Stroke Care Dashboard",
+    layout="wide",
+    initial_sidebar_state="collapsed"
+)
+
+# --- 2. CSS WITH MOBILE SCROLL FIX ---
+st.markdown("""
+<style>
+    h1, h2, h3 { font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; }
+
+    /* Force charts to fit width */
+    .js-plotly-plot { width: 100% !important; }
+
+    /* --- MOBILE SCROLL FIX --- */
+    .js-plotly-plot .plotly {
+        touch-action: pan-y !important;
+    }
+</style>
+""", unsafe_allow_html=True)
+
+chart_config = figures.chart_config
+
+# --- 3. LOAD & PROCESS DATA ---
+CSV_PATH = 'file.csv'
+
+# The item matrix is parsed once with the frame (ADL_1..ADL_10 columns); this only counts
+@st.cache_data
+def load_analysis(rules, source, version):
+    try:
+        if source == 'store':
+            conn = store.connect()
+            matrix, villages, groups = store.adl_item_rows(conn, rules)
+            conn.close()
+        else:
+            if source == 'snapshot':
+                df = snapshot.load_frame(version, 'patients')
+            else:
+                # Scored once per host and shared between worker processes (see shared.py)
+                df = shared.scored_patients(rules, CSV_PATH)
+            matrix, villages, groups = scoring.adl_matrix(df, rules), df['Village'], df['ADL_Group']
+    except:
+        return None
+
+    analysis = adl_analysis.analyze(matrix, villages, groups, rules, scoring.adl_group_order(rules))
+    return analysis, figures.adl_item_figures(analysis)
+
+rules = scoring.load_rules()
+loaded = load_analysis(rules, *shared.data_source(rules, CSV_PATH))
+
+if loaded is None:
+    st.error("ไม่พบไฟล์ 'file.csv' กรุณาตรวจสอบว่าไฟล์อยู่ในโฟลเดอร์เดียวกัน")
+    st.stop()
+
+analysis, figs = loaded
+
+# --- 4. DASHBOARD LAYOUT ---
+
+st.title("วิเคราะห์คะแนน ADL รายข้อ (Item-level ADL)")
+st.markdown(f"ผู้ป่วยทั้งหมด {analysis['patients']} คน")
+st.markdown("---")
+
+st.subheader("การกระจายคะแนนแต่ละข้อ")
+st.plotly_chart(figs['distribution'], use_container_width=True, config=chart_config)
+
+st.markdown("---")
+
+st.subheader("การกระจายคะแนนแต่ละข้อ แยกตามหมู่บ้าน")
+st.plotly_chart(figs['dist_by_village'], use_container_width=True, config=chart_config)
+
+st.subheader("การกระจายคะแนนแต่ละข้อ แยกตามกลุ่มอาการ")
+st.plotly_chart(figs['dist_by_group'], use_container_width=True, config=chart_config)
+
+st.markdown("---")
+
+r1_c1, r1_c2 = st.columns(2)
+
+with r1_c1:
+    st.subheader("คะแนนเฉลี่ยรายข้อ แยกตามหมู่บ้าน (% ของคะแนนเต็ม)")
+    st.plotly_chart(figs['mean_by_village'], use_container_width=True, config=chart_config)
+
+with r1_c2:
+    st.subheader("คะแนนเฉลี่ยรายข้อ แยกตามกลุ่มอาการ (% ของคะแนนเต็ม)")
+    st.plotly_chart(figs['mean_by_group'], use_container_width=True, config=chart_config)
+
+st.markdown("---")
+
+r2_c1, r2_c2 = st.columns(2)
+
+with r2_c1:
+    st.subheader("ความสัมพันธ์ระหว่างข้อ (Correlation)")
+    st.plotly_chart(figs['correlation'], use_container_width=True, config=chart_config)
+
+with r2_c2:
+    st.subheader("รูปแบบข้อที่ทำได้ไม่เต็มที่ที่พบบ่อย")
+    st.dataframe(analysis['patterns'], use_container_width=True, hide_index=True)
@@ -0,0 +1,109 @@
+"""
+Item-level ADL analytics.
+
+Everything here works on the N x 10 uint8 item matrix from
+scoring.adl_matrix (or the adl_1..adl_10 columns of the SQLite store), plus
+one integer code per row for village / ADL group. Distributions are a single
+np.bincount over a combined (group, item, score) index, so the cost is one
+pass over the matrix no matter how many groups or score levels there are.
+"""
+import lazy
+import scoring
+
+np = lazy.module('numpy')
+pd = lazy.module('pandas')
+
+NO_DEFICIT = "ไม่มี (ทำได้เองทุกข้อ)"
+
+
+def _levels(rules):
+    return max(rules['validation']['adl_item_max']) + 1
+
+
+def distribution(matrix, rules, codes=None, groups=None):
+    """
+    Counts of each score level per item, optionally split by group.
+    Returns a long frame: [Group,] Item, Score, Count.
+    """
+    n_items, n_levels = matrix.shape[1], _levels(rules)
+    m = np.minimum(matrix, n_levels - 1).astype(np.int64)
+    index = np.arange(n_items) * n_levels + m
+    if codes is None:
+        counts = np.bincount(index.ravel(), minlength=n_items * n_levels)
+        out = pd.DataFrame({
+            'Item': np.repeat(rules['adl_labels'], n_levels),
+            'Score': np.tile(np.arange(n_levels), n_items),
+            'Count': counts,
+        })
+    else:
+        n_groups = len(groups)
+        index = index + codes[:, None].astype(np.int64) * (n_items * n_levels)
+        counts = np.bincount(index.ravel(), minlength=n_groups * n_items * n_levels)
+        out = pd.DataFrame({
+            'Group': np.repeat(np.asarray(groups, dtype=object), n_items * n_levels),
+            'Item': np.tile(np.repeat(rules['adl_labels'], n_levels), n_groups),
+            'Score': np.tile(np.arange(n_levels), n_groups * n_items),
+            'Count': counts,
+        })
+    # Drop empty levels an item can't reach (Feeding goes to 2, Transfer to 3, ...);
+    # out-of-range answers (flagged by validation.py) still show up
+    item_max = dict(zip(rules['adl_labels'], rules['validation']['adl_item_max']))
+    keep = (out['Score'] <= out['Item'].map(item_max)) | (out['Count'] > 0)
+    return out[keep].reset_index(drop=True)
+
+
+def mean_by(matrix, rules, codes, groups):
+    """Mean item score per group as % of the item maximum (Group x Item)."""
+    n_groups = len(groups)
+    size = np.bincount(codes, minlength=n_groups)
+    sums = np.stack([np.bincount(codes, weights=matrix[:, j], minlength=n_groups)
+                     for j in range(matrix.shape[1])], axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        pct = 100 * sums / size[:, None] / np.asarray(rules['validation']['adl_item_max'])
+    out = pd.DataFrame(pct.round(1), index=pd.Index(groups, name='Group'), columns=rules['adl_labels'])
+    out.insert(0, 'Patients', size)
+    return out
+
+
+def correlation(matrix, rules):
+    """Pearson correlation between items (NaN where an item has no variation)."""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        corr = np.corrcoef(matrix.T.astype(float))
+    return pd.DataFrame(corr, index=rules['adl_labels'], columns=rules['adl_labels']).round(2)
+
+
+def deficit_patterns(matrix, rules, top=10):
+    """
+    Most common sets of items scored below their maximum. Each row's deficits
+    are packed into one integer bitmask, so counting patterns is np.unique.
+    """
+    deficit = matrix < np.asarray(rules['validation']['adl_item_max'], dtype=np.uint8)
+    bits = deficit.astype(np.uint16) @ (1 << np.arange(matrix.shape[1], dtype=np.uint16))
+    patterns, counts = np.unique(bits, return_counts=True)
+    order = np.argsort(-counts, kind='stable')[:top]
+    labels = np.asarray(rules['adl_labels'], dtype=object)
+    return pd.DataFrame({
+        'Pattern': [', '.join(labels[(p >> np.arange(len(labels))) & 1 == 1]) or NO_DEFICIT for p in patterns[order]],
+        'Items': [int(p).bit_count() for p in patterns[order]],
+        'Patients': counts[order],
+        'Percent': (100 * counts[order] / max(len(matrix), 1)).round(1),
+    })
+
+
+def analyze(matrix, villages, adl_groups, rules, group_order=None):
+    """All item-level views for one patient set. `villages` / `adl_groups` are per-row labels."""
+    v_names = sorted(pd.unique(np.asarray(villages)), key=scoring.natural_key)
+    v_codes = pd.Index(v_names).get_indexer(np.asarray(villages))
+    g_names = list(group_order) if group_order is not None else sorted(pd.unique(np.asarray(adl_groups)))
+    g_codes = pd.Index(g_names).get_indexer(np.asarray(adl_groups))
+    known = g_codes >= 0
+    return {
+        'patients': len(matrix),
+        'distribution': distribution(matrix, rules),
+        'by_village': distribution(matrix, rules, v_codes, list(v_names)),
+        'by_group': distribution(matrix[known], rules, g_codes[known], g_names),
+        'mean_by_village': mean_by(matrix, rules, v_codes, list(v_names)),
+        'mean_by_group': mean_by(matrix[known], rules, g_codes[known], g_names),
+        'correlation': correlation(matrix, rules),
+        'patterns': deficit_patterns(matrix, rules),
+    }
@@ -0,0 +1,98 @@
+import lazy
+import scoring
+import validation
+
+pd = lazy.module('pandas')
+
+# --- SHARED RESULT SHAPES ---
+# The dashboards render from these small frames. They are built either from the
+# in-memory scored frame (below) or by SQL in store.py; both return the same keys
+# and column names so the page code doesn't care which backend produced them.
+PATIENT_TABLE_COLUMNS = ['ชื่อ-สกุล', 'หมู่บ้าน', 'คะแนน ADL (เต็ม 20)', 'คะแนนความเสี่ยงบ้าน (เต็ม 10)', 'กลุ่มอาการ']
+LEDGER_TABLE_COLUMNS = ['รายการ', 'วันที่ (อ้างอิง)', 'หมวดหมู่', 'จำนวนเงิน']
+PAGE_ROWS = 50  # patient list rows per page
+
+
+def bedridden_label(rules):
+    return rules['mobility']['map']['0']
+
+
+def _counts(series, name):
+    counts = series.value_counts().reset_index()
+    counts.columns = [name, 'Count']
+    return counts
+
+
+def patient_table(df, rules, village=None, adl_group=None, limit=None, critical_only=False, offset=0):
+    """
+    Patient list sorted sickest first, optionally filtered by village / ADL group /
+    critical flag; `limit` / `offset` select one page.
+    """
+    if critical_only:
+        df = df[df['Is_Critical']]
+    if village is not None:
+        df = df[df['Village'] == village]
+    if adl_group is not None:
+        df = df[df['ADL_Group'] == adl_group]
+    table_df = df[[scoring.name_column(df, rules), 'Village', 'ADL_Score', 'Env_Risk_Score', 'ADL_Group']].copy()
+    table_df.columns = PATIENT_TABLE_COLUMNS
+    table_df = table_df.sort_values(by=PATIENT_TABLE_COLUMNS[2], ascending=True, kind='stable')
+    return table_df.iloc[offset:offset + limit] if limit is not None else table_df.iloc[offset:]
+
+
+def patient_aggregates(df, rules):
+    name_col = scoring.name_column(df, rules)
+    order = scoring.adl_group_order(rules)
+
+    risk_counts = scoring.env_hits(df, rules).sum().rename(index=scoring.env_labels(df, rules))
+    risk_df = risk_counts.rename_axis('Risk').reset_index(name='Count').sort_values('Count', ascending=True)
+
+    adl_counts = df['ADL_Group'].value_counts().reindex(order, fill_value=0).reset_index()
+    adl_counts.columns = ['Group', 'Count']
+
+    # One row per (ADL, home risk) score pair: at most 21 x 11 rows whatever N is
+    risk_cells = df.groupby(['ADL_Score', 'Env_Risk_Score']).size().reset_index(name='Count')
+
+    flagged = df[df['DQ_Flags'] > 0]
+    dq_table = flagged[[name_col, 'Village']].copy()
+    dq_table['ปัญหา'] = flagged['DQ_Flags'].map(validation.describe)
+    dq_table.columns = ['ชื่อ-สกุล', 'หมู่บ้าน', 'ปัญหา']
+
+    return {
+        'total': len(df),
+        'critical': int(df['Is_Critical'].sum()),
+        'risky_homes': int(df['Is_Risky_Home'].sum()),
+        'bedridden': int((df['Mobility_Label'] == bedridden_label(rules)).sum()),
+        'village_counts': _counts(df['Village'], 'Village'),
+        'sex_counts': _counts(df['Sex'], 'Sex'),
+        'mobility_counts': _counts(df['Mobility_Label'], 'Status'),
+        'adl_counts': adl_counts,
+        'risk_df': risk_df,
+        'risk_cells': risk_cells,
+        'dq_summary': validation.summary(df['DQ_Flags']),
+        'dq_table': dq_table,
+    }
+
+
+def ledger_aggregates(budget, df_exp):
+    df_exp = df_exp.reset_index(drop=True)
+    total_spend = df_exp['Expense'].sum()
+
+    running = pd.DataFrame({'Cumulative': df_exp['Expense'].cumsum()})
+    running['Run_Balance'] = budget - running['Cumulative']
+
+    display_df = df_exp[['Item', 'Date_Group', 'Category', 'Expense']].copy()
+    display_df.columns = LEDGER_TABLE_COLUMNS
+
+    return {
+        'budget': budget,
+        'spend': total_spend,
+        'balance': budget - total_spend,
+        'burn_rate': (total_spend / budget) * 100,
+        'count': len(df_exp),
+        'running': running,
+        'cat_sum': df_exp.groupby('Category')['Expense'].sum().reset_index(),
+        'daily_sum': df_exp.groupby('Date_Group')['Expense'].sum().reset_index(),
+        'top_10': df_exp.sort_values(by='Expense', ascending=False, kind='stable').head(10)[['Item', 'Expense']],
+        'ledger_table': display_df,
+    }
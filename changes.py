@@ -0,0 +1,261 @@
+"""
+Change feed between successive survey exports.
+
+    python changes.py record [--csv file.csv]        # diff against the last recorded export
+    python changes.py diff old.csv new.csv [--out changes.csv]
+
+Each export is reduced to one row per patient: Patient_Key, a 64-bit hash of
+the raw columns and the derived fields the dashboards care about. Two states
+are matched through a hash index on Patient_Key, so the diff is O(n), and
+every field comparison is a whole-array !=. Patient_Key includes the house
+number and หมู่, so rows left over on both sides are then paired by name
+(when the name is unique among them): an address or village correction is
+reported as a change to the same patient, not a removal plus an addition.
+
+`record` appends the differences to an append-only JSON-lines log (one batch
+per new export) and keeps the latest state next to it; nothing else from the
+old export is stored. `snapshot.py build` records automatically. The
+dashboards tail the log by byte offset, so only new batches are read.
+"""
+import argparse
+import bisect
+import json
+import os
+import threading
+from datetime import datetime
+
+import comparison
+import lazy
+import pseudonym
+import scoring
+import validation
+
+np = lazy.module('numpy')
+pd = lazy.module('pandas')
+
+CHANGES_DIR = os.environ.get('STROKE_CHANGES', 'changes')
+TRACKED = ['Village', 'ADL_Score', 'ADL_Group', 'Env_Risk_Score', 'Mobility_Label',
+           'Is_Critical', 'Is_Risky_Home', 'DQ_Flags']
+ADDED, REMOVED, CHANGED = 'added', 'removed', 'changed'
+CHANGE_LABELS = {ADDED: "เพิ่มใหม่", REMOVED: "ถูกลบ", CHANGED: "แก้ไข"}
+RAW_ONLY = "แก้ไขข้อมูลอื่น (คะแนนไม่เปลี่ยน)"
+
+
+# --- STATE & DIFF ---
+def patient_state(raw, rules, public=False):
+    """One row per patient (latest submission): key, raw row hash, name and TRACKED fields."""
+    df = scoring.score(raw, rules)
+    df['Row_Hash'] = pd.util.hash_pandas_object(raw, index=False).to_numpy()
+    df['DQ_Flags'] = validation.validate(df, rules)
+    if public:
+        pseudonym.anonymize(df, rules)
+    df = comparison.latest_per_patient(df, rules)
+    state = df[['Patient_Key', 'Row_Hash', scoring.name_column(df, rules)] + TRACKED].reset_index(drop=True)
+    return state.rename(columns={scoring.name_column(df, rules): 'Name'})
+
+
+def _names(state):
+    return state['Name'].astype(str).str.replace(r'\s+', '', regex=True).to_numpy(dtype=object)
+
+
+def _pair_by_name(old, new, pos):
+    """
+    Fills pos (new row -> old row, -1 when unmatched) for leftover rows whose
+    name occurs exactly once among the leftovers of each side.
+    """
+    kept = np.zeros(len(old), dtype=bool)
+    kept[pos[pos >= 0]] = True
+    gone, fresh = np.flatnonzero(~kept), np.flatnonzero(pos < 0)
+    if not len(gone) or not len(fresh):
+        return pos
+    gone_names = pd.Series(_names(old)[gone])
+    fresh_names = pd.Series(_names(new)[fresh])
+    gone, gone_names = gone[~gone_names.duplicated(keep=False).to_numpy()], gone_names.drop_duplicates(keep=False)
+    fresh, fresh_names = fresh[~fresh_names.duplicated(keep=False).to_numpy()], fresh_names.drop_duplicates(keep=False)
+    hit = pd.Index(gone_names.to_numpy()).get_indexer(fresh_names.to_numpy())
+    pos = pos.copy()
+    pos[fresh[hit >= 0]] = gone[hit[hit >= 0]]
+    return pos
+
+
+def diff(old, new):
+    """
+    Compares two patient states. Returns added / removed rows and, for patients
+    in both whose raw row changed, old/new values plus the list of TRACKED
+    fields that differ ('Fields' is empty when only raw columns changed).
+    Patients are matched on Patient_Key, then leftovers by name (see _pair_by_name).
+    """
+    pos = pd.Index(old['Patient_Key'].to_numpy()).get_indexer(new['Patient_Key'].to_numpy())
+    pos = _pair_by_name(old, new, pos)
+    matched = pos >= 0
+    kept = np.zeros(len(old), dtype=bool)
+    kept[pos[matched]] = True
+
+    before = old.iloc[pos[matched]].reset_index(drop=True)
+    after = new[matched].reset_index(drop=True)
+    edited = before['Row_Hash'].to_numpy() != after['Row_Hash'].to_numpy()
+    differs = np.column_stack([np.asarray(before[f], dtype=object) != np.asarray(after[f], dtype=object)
+                               for f in TRACKED])[edited]
+    tracked = np.asarray(TRACKED, dtype=object)
+
+    changed = after.loc[edited, ['Patient_Key', 'Name']].reset_index(drop=True)
+    for f in TRACKED:
+        changed[f + '_Old'] = before.loc[edited, f].to_numpy()
+        changed[f + '_New'] = after.loc[edited, f].to_numpy()
+    changed['Fields'] = [list(tracked[row]) for row in differs]
+
+    return {
+        ADDED: new[~matched].reset_index(drop=True),
+        REMOVED: old[~kept].reset_index(drop=True),
+        CHANGED: changed,
+    }
+
+
+def diff_exports(old_raw, new_raw, rules, public=False):
+    return diff(patient_state(old_raw, rules, public), patient_state(new_raw, rules, public))
+
+
+# --- APPEND-ONLY LOG ---
+def _paths(out_dir, public):
+    prefix = 'public_' if public else ''
+    return os.path.join(out_dir, prefix + 'log.jsonl'), os.path.join(out_dir, prefix + 'state.pkl')
+
+
+def log_path(out_dir=CHANGES_DIR, public=None):
+    return _paths(out_dir, pseudonym.PUBLIC if public is None else public)[0]
+
+
+def _value(v):
+    return v.item() if hasattr(v, 'item') else v
+
+
+def entries(result, batch, version, recorded_at):
+    """Flattens a diff() result into log records."""
+    base = {'batch': batch, 'version': version, 'recorded_at': recorded_at}
+    out = []
+    for kind, side in ((ADDED, 1), (REMOVED, 0)):
+        for row in result[kind].to_dict('records'):
+            values = {f: [None, _value(row[f])] if side else [_value(row[f]), None] for f in TRACKED}
+            out.append({**base, 'change': kind, 'patient_key': str(row['Patient_Key']), 'name': row['Name'],
+                        'village': row['Village'], 'fields': values})
+    for row in result[CHANGED].to_dict('records'):
+        values = {f: [_value(row[f + '_Old']), _value(row[f + '_New'])] for f in row['Fields']}
+        out.append({**base, 'change': CHANGED, 'patient_key': str(row['Patient_Key']), 'name': row['Name'],
+                    'village': row['Village_New'], 'fields': values})
+    return out
+
+
+def record(raw, rules, out_dir=CHANGES_DIR, public=None):
+    """
+    Diffs `raw` against the last recorded export and appends one batch to the
+    log. The first call only stores the baseline. Returns the number of
+    entries appended.
+    """
+    public = pseudonym.PUBLIC if public is None else public
+    log_file, state_file = _paths(out_dir, public)
+    version = scoring.data_hash(raw)[:16]
+    new = patient_state(raw, rules, public)
+    try:
+        old = pd.read_pickle(state_file)
+    except FileNotFoundError:
+        old = None
+    if old is not None and old.attrs.get('version') == version:
+        return 0
+
+    batch = old.attrs.get('batch', 0) + 1 if old is not None else 0
+    appended = 0
+    if old is not None:
+        lines = entries(diff(old, new), batch, version, datetime.now().isoformat(timespec='seconds'))
+        if lines:
+            os.makedirs(out_dir, exist_ok=True)
+            payload = ''.join(json.dumps(e, ensure_ascii=False, default=str) + '\n' for e in lines)
+            with open(log_file, 'a', encoding='utf-8') as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+        appended = len(lines)
+
+    new.attrs.update({'version': version, 'batch': batch})
+    os.makedirs(out_dir, exist_ok=True)
+    tmp = state_file + '.tmp'
+    new.to_pickle(tmp)
+    os.replace(tmp, state_file)
+    return appended
+
+
+def tail(path, offset=0):
+    """Log records after byte `offset`. Returns (records, new offset); a partial last line is left for later."""
+    try:
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+    except FileNotFoundError:
+        return [], 0
+    end = data.rfind(b'\n') + 1
+    records = [json.loads(line) for line in data[:end].decode('utf-8').splitlines() if line]
+    return records, offset + end
+
+
+class ChangeFeed:
+    """In-memory copy of the log, shared by every session and extended by tail()."""
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.records = []
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        with self._lock:
+            size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+            if size < self.offset:  # log was replaced: start over
+                self.offset, self.records = 0, []
+            if size > self.offset:
+                records, self.offset = tail(self.path, self.offset)
+                self.records = self.records + records
+            return self.records
+
+
+def since(records, batch):
+    """Records from batches after `batch` as a display table (records are in batch order)."""
+    rows = records[bisect.bisect_right(records, batch, key=lambda r: r['batch']):]
+    details = ['; '.join(f"{f}: {'-' if o is None else o} → {'-' if n is None else n}"
+                         for f, (o, n) in r['fields'].items()) or RAW_ONLY if r['change'] == CHANGED else ''
+               for r in rows]
+    return pd.DataFrame({
+        'ครั้งที่': [r['batch'] for r in rows],
+        'เวลาบันทึก': [r['recorded_at'] for r in rows],
+        'ประเภท': [CHANGE_LABELS[r['change']] for r in rows],
+        'ชื่อ-สกุล': [r['name'] for r in rows],
+        'หมู่บ้าน': [r['village'] for r in rows],
+        'รายละเอียด': details,
+    })
+
+
+# --- CLI ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Change feed between survey exports")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_rec = sub.add_parser('record', help="append the changes since the last recorded export")
+    p_rec.add_argument('--csv', default='file.csv')
+    p_rec.add_argument('--out', default=CHANGES_DIR)
+    p_rec.add_argument('--public', action='store_true', default=pseudonym.PUBLIC)
+    p_diff = sub.add_parser('diff', help="compare two exports")
+    p_diff.add_argument('old')
+    p_diff.add_argument('new')
+    p_diff.add_argument('--out', help="write the changed patients to this CSV file")
+    args = parser.parse_args(argv)
+
+    rules = scoring.load_rules()
+    if args.command == 'record':
+        n = record(pd.read_csv(args.csv), rules, args.out, args.public)
+        print(f"{log_path(args.out, args.public)}: {n} entries appended")
+    elif args.command == 'diff':
+        result = diff_exports(pd.read_csv(args.old), pd.read_csv(args.new), rules)
+        print(f"added: {len(result[ADDED])}, removed: {len(result[REMOVED])}, changed: {len(result[CHANGED])}")
+        if args.out:
+            result[CHANGED].to_csv(args.out, index=False, encoding='utf-8-sig')
+
+
+if __name__ == '__main__':
+    main()
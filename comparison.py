@@ -0,0 +1,132 @@
+"""
+Pre-test / post-test comparison.
+
+    python comparison.py file.csv file_post.csv [--out deltas.csv]
+
+Both waves are exports in the file.csv format. Patients are matched on
+Patient_Key (see scoring.py) through a hash index, so pairing is a single
+O(n) lookup, and every delta (ADL score, each ADL item, each env risk item)
+is a whole-array subtraction over the matched rows.
+"""
+import argparse
+from collections import OrderedDict
+
+import lazy
+import scoring
+
+np = lazy.module('numpy')
+pd = lazy.module('pandas')
+
+_CACHE_SIZE = 16
+_results = OrderedDict()
+
+
+def latest_per_patient(df, rules):
+    """Keeps the most recent submission for each Patient_Key."""
+    stamps = pd.to_datetime(df.iloc[:, rules['columns']['timestamp']],
+                            format=rules['validation']['timestamp_format'], errors='coerce')
+    order = np.argsort(stamps.to_numpy(), kind='stable')  # NaT sorts last
+    return df.iloc[order].drop_duplicates('Patient_Key', keep='last')
+
+
+def pair(pre, post, rules):
+    """
+    Matches two scored waves and returns one row per patient found in both,
+    with pre/post values and deltas (post - pre).
+    """
+    pre = latest_per_patient(pre, rules)
+    post = latest_per_patient(post, rules)
+
+    index = pd.Index(pre['Patient_Key'].to_numpy())
+    pos = index.get_indexer(post['Patient_Key'].to_numpy())
+    matched = pos >= 0
+    pre_pos, post_pos = pos[matched], np.flatnonzero(matched)
+
+    # Item matrices come from the scored columns, gathered by position
+    adl_pre = scoring.adl_matrix(pre, rules).astype(int)[pre_pos]
+    adl_post = scoring.adl_matrix(post, rules).astype(int)[post_pos]
+    env_pre = scoring.env_hits(pre, rules).to_numpy(dtype=np.int8)[pre_pos]
+    env_post = scoring.env_hits(post, rules).to_numpy(dtype=np.int8)[post_pos]
+
+    take_pre = lambda col: pre[col].to_numpy()[pre_pos]
+    take_post = lambda col: post[col].to_numpy()[post_pos]
+    pairs = pd.DataFrame({
+        'Patient_Key': take_post('Patient_Key'),
+        'ชื่อ-สกุล': post[scoring.name_column(post, rules)].to_numpy()[post_pos],
+        'Village': take_pre('Village'),
+        'ADL_Group_Pre': take_pre('ADL_Group'),
+        'ADL_Group_Post': take_post('ADL_Group'),
+        'ADL_Score_Pre': take_pre('ADL_Score'),
+        'ADL_Score_Post': take_post('ADL_Score'),
+        'Env_Risk_Pre': take_pre('Env_Risk_Score'),
+        'Env_Risk_Post': take_post('Env_Risk_Score'),
+    })
+    pairs['ADL_Delta'] = pairs['ADL_Score_Post'] - pairs['ADL_Score_Pre']
+    pairs['Env_Risk_Delta'] = pairs['Env_Risk_Post'] - pairs['Env_Risk_Pre']
+    pairs['Group_Changed'] = pairs['ADL_Group_Pre'] != pairs['ADL_Group_Post']
+
+    adl_delta = pd.DataFrame(adl_post - adl_pre, columns=[f'Δ ADL {l}' for l in rules['adl_labels']])
+    env_delta = pd.DataFrame(env_post - env_pre, columns=[f'Δ Env {l}' for l in rules['env_labels']])
+    pairs = pd.concat([pairs, adl_delta, env_delta], axis=1)
+
+    unmatched = {'pre_only': int(len(pre) - matched.sum()), 'post_only': int((~matched).sum())}
+    return pairs, unmatched
+
+
+def summarize(pairs, by):
+    """Per-group counts and mean deltas; `by` is 'Village' or 'ADL_Group_Pre'."""
+    g = pairs.assign(Improved=pairs['ADL_Delta'] > 0, Declined=pairs['ADL_Delta'] < 0).groupby(by, sort=True)
+    summary = g.agg(
+        Patients=('ADL_Delta', 'size'),
+        ADL_Delta_Mean=('ADL_Delta', 'mean'),
+        Improved=('Improved', 'sum'),
+        Declined=('Declined', 'sum'),
+        Env_Risk_Delta_Mean=('Env_Risk_Delta', 'mean'),
+        Group_Changed=('Group_Changed', 'sum'),
+    )
+    summary['Unchanged'] = summary['Patients'] - summary['Improved'] - summary['Declined']
+    return summary.round(2).reset_index()
+
+
+def compare(pre_raw, post_raw, rules):
+    """
+    Scores both raw exports, pairs them and summarizes by village and ADL
+    group. Results are cached on the content of both waves and the rule set.
+    """
+    key = (scoring.data_hash(pre_raw), scoring.data_hash(post_raw), scoring.rules_hash(rules))
+    if key in _results:
+        _results.move_to_end(key)
+        return _results[key]
+
+    pairs, unmatched = pair(scoring.score(pre_raw, rules), scoring.score(post_raw, rules), rules)
+    result = {
+        'pairs': pairs,
+        'by_village': summarize(pairs, 'Village'),
+        'by_group': summarize(pairs, 'ADL_Group_Pre'),
+        'unmatched': unmatched,
+    }
+    _results[key] = result
+    if len(_results) > _CACHE_SIZE:
+        _results.popitem(last=False)
+    return result
+
+
+# --- CLI ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-test / post-test comparison of two survey exports")
+    parser.add_argument('pre', help="pre-test export (file.csv format)")
+    parser.add_argument('post', help="post-test export (file.csv format)")
+    parser.add_argument('--out', help="write the per-patient deltas to this CSV file")
+    args = parser.parse_args(argv)
+
+    result = compare(pd.read_csv(args.pre), pd.read_csv(args.post), scoring.load_rules())
+    print(f"matched: {len(result['pairs'])}, pre only: {result['unmatched']['pre_only']}, "
+          f"post only: {result['unmatched']['post_only']}")
+    print(result['by_village'].to_string(index=False))
+    print(result['by_group'].to_string(index=False))
+    if args.out:
+        result['pairs'].to_csv(args.out, index=False, encoding='utf-8-sig')
+
+
+if __name__ == '__main__':
+    main()
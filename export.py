@@ -0,0 +1,133 @@
+"""
+Chunked CSV / XLSX export of the filtered patient lists and the ledger.
+
+Rows arrive as an iterator of small DataFrames (slices of an in-memory frame,
+or `chunksize` reads from the SQLite store) and are written straight to disk:
+CSV through a byte generator, XLSX through openpyxl's write-only workbook, so
+building a file never holds all rows at once. Finished files are kept under
+exports/ named by a hash of (data version, filters, format); an identical
+request is served from that file instead of being rebuilt. Reuse refreshes a
+file's mtime, so pruning drops the least recently used files, and never one
+younger than PRUNE_GRACE_S (another session may be about to read it).
+
+The download itself is not streamed: st.download_button needs the file as
+bytes, so each click reads the finished file into memory once.
+"""
+import os
+import tempfile
+import time
+
+import lazy
+import scoring
+
+openpyxl = lazy.module('openpyxl')
+
+EXPORT_DIR = os.environ.get('STROKE_EXPORTS', 'exports')
+CHUNK_ROWS = 5000
+PRUNE_GRACE_S = 300
+
+MIME = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def frame_chunks(df, chunk_rows=CHUNK_ROWS):
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def csv_chunks(chunks):
+    """Encodes DataFrame chunks as CSV bytes, header once. BOM first so Excel reads Thai correctly."""
+    first = True
+    for chunk in chunks:
+        text = chunk.to_csv(index=False, header=first, lineterminator='\n')
+        yield ('\ufeff' + text if first else text).encode('utf-8')
+        first = False
+
+
+def write_csv(chunks, path):
+    with open(path, 'wb') as f:
+        for block in csv_chunks(chunks):
+            f.write(block)
+
+
+def write_xlsx(chunks, path, sheet='Sheet1'):
+    # write_only keeps just the current row in memory and streams the sheet to disk
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(title=sheet[:31])
+    header_done = False
+    for chunk in chunks:
+        if not header_done:
+            ws.append([str(c) for c in chunk.columns])
+            header_done = True
+        for row in chunk.itertuples(index=False, name=None):
+            ws.append([v.item() if hasattr(v, 'item') else v for v in row])
+    if not header_done:
+        ws.append([])
+    wb.save(path)
+
+
+def cached_export(key_parts, fmt, chunks, sheet='Sheet1', out_dir=EXPORT_DIR):
+    """
+    Returns the path of the export for `key_parts` (data version + filters),
+    building it from `chunks()` only when it isn't on disk yet.
+    """
+    key = scoring._digest(list(key_parts) + [fmt])[:20]
+    path = os.path.join(out_dir, f'{key}.{fmt}')
+    try:
+        os.utime(path)  # reused: most recently used for prune()
+        return path
+    except FileNotFoundError:
+        pass
+    os.makedirs(out_dir, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(suffix='.' + fmt, prefix='.export-', dir=out_dir)
+    os.close(fd)
+    try:
+        if fmt == 'csv':
+            write_csv(chunks(), tmp)
+        else:
+            write_xlsx(chunks(), tmp, sheet)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    prune(out_dir)
+    return path
+
+
+def on_demand(key_parts, fmt, chunks, sheet='Sheet1'):
+    """
+    Zero-argument callable for st.download_button(data=...): Streamlit calls
+    it only when the button is clicked, so the file is built (or reused) then
+    and read whole into memory for that response.
+    """
+    def read():
+        try:
+            path = cached_export(key_parts, fmt, chunks, sheet)
+            with open(path, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            pass
+        # Pruned by another session between the lookup and the open: build it again
+        with open(cached_export(key_parts, fmt, chunks, sheet), 'rb') as f:
+            return f.read()
+    return read
+
+
+def prune(out_dir=EXPORT_DIR, keep=50, grace=PRUNE_GRACE_S):
+    """Deletes all but the `keep` most recently used exports, sparing any used in the last `grace` seconds."""
+    used = {}
+    for f in os.listdir(out_dir):
+        if not f.startswith('.'):
+            try:
+                used[os.path.join(out_dir, f)] = os.path.getmtime(os.path.join(out_dir, f))
+            except FileNotFoundError:
+                pass  # removed by a concurrent prune
+    cutoff = time.time() - grace
+    for path in sorted(used, key=used.get, reverse=True)[keep:]:
+        if used[path] < cutoff:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,208 @@
+import plotly.graph_objects as go
+
+import lazy
+import scoring
+
+pd = lazy.module('pandas')
+px = lazy.module('plotly.express')
+
+# --- HELPER: DISABLE ZOOM BUT KEEP DOWNLOAD ---
+def make_static(fig):
+    """
+    Locks the chart layout to prevent mobile scroll hijacking,
+    but leaves the structure compatible with the download button.
+    """
+    fig.update_layout(
+        dragmode=False,   # Disables the "Rectangle Zoom" tool on the chart surface
+        clickmode='event', # Allows clicking (for tooltips) but no zoom
+        margin=dict(l=20, r=20, t=40, b=20)
+    )
+    # Lock axes so they don't zoom on touch/scroll
+    fig.update_xaxes(fixedrange=True)
+    fig.update_yaxes(fixedrange=True)
+    return fig
+
+# --- CONFIG: TOOLBAR SETTINGS ---
+chart_config = {
+    'displayModeBar': True,         # Show Toolbar (for Download)
+    'scrollZoom': False,            # Disable scroll zooming
+    'showAxisDragHandles': False,   # Disable axis drag
+    'displaylogo': False,           # Hide Plotly logo
+    # Remove Zoom/Pan tools, Keep Download (toImage)
+    'modeBarButtonsToRemove': [
+        'zoom2d', 'pan2d', 'select2d', 'lasso2d',
+        'zoomIn2d', 'zoomOut2d', 'autoScale2d', 'resetScale2d',
+        'hoverClosestCartesian', 'hoverCompareCartesian'
+    ]
+}
+
+PROGRESS_DATA = {
+    "Task": [
+        "1.การแต่งตั้งคณะทำงาน", "2.กระบวนการคัดเลือกตัวอย่าง",
+        "3.ประชุมคณะทำงาน & ที่ปรึกษา", "4.ประชุมอบรม Caregiver & อสม.",
+        "5.ลงสำรวจเก็บข้อมูล Pre-test", "6.ตรวจสอบความถูกต้องข้อมูล",
+        "7.พัฒนาท่ากายภาพบำบัดต้นแบบ", "8.พัฒนา Software ต้นแบบ"
+    ],
+    "Progress": [100, 100, 100, 100, 100, 100, 100, 100]
+}
+
+
+# --- PATIENT DASHBOARD (backup.py) ---
+def patient_figures(agg, rules):
+    """Builds every chart on the patient dashboard from the aggregates in aggregates.py / store.py."""
+    fig_village = px.bar(agg['village_counts'], x='Village', y='Count', text='Count',
+                         color_discrete_sequence=['#475569'])
+    make_static(fig_village)
+    fig_village.update_layout(xaxis_title=None, yaxis_title=None)
+
+    color_map_sex = {'ชาย': '#3b82f6', 'หญิง': '#ec4899', 'ไม่ระบุ': '#94a3b8'}
+    fig_sex = px.pie(agg['sex_counts'], values='Count', names='Sex', hole=0.4,
+                     color='Sex', color_discrete_map=color_map_sex)
+    fig_sex.update_traces(textposition='outside', texttemplate='%{percent:.0%} ( %{value} คน )<br>%{label}')
+    make_static(fig_sex)
+    # Increased margins for mobile labels
+    fig_sex.update_layout(showlegend=False, margin=dict(t=30, b=20, l=50, r=50))
+
+    fig_mob = px.bar(agg['mobility_counts'], x='Status', y='Count', text='Count',
+                     color='Status', color_discrete_sequence=px.colors.sequential.Tealgrn_r)
+    make_static(fig_mob)
+    fig_mob.update_layout(xaxis_title=None, yaxis_title=None, showlegend=False)
+
+    order = scoring.adl_group_order(rules)
+    color_map_adl = dict(zip(order, ["#ef4444", "#f59e0b", "#10b981"]))
+    fig_adl = px.pie(agg['adl_counts'], values='Count', names='Group', hole=0.4,
+                     color='Group', color_discrete_map=color_map_adl)
+    fig_adl.update_traces(textposition='outside', texttemplate='%{label}<br>%{percent:.0%} ( %{value} คน )')
+    make_static(fig_adl)
+    # Increased margins for mobile labels
+    fig_adl.update_layout(showlegend=False, margin=dict(t=30, b=20, l=50, r=50))
+
+    fig_risk = px.bar(agg['risk_df'], x='Count', y='Risk', text='Count', orientation='h',
+                      color='Count', color_continuous_scale='Blues')
+    make_static(fig_risk)
+    fig_risk.update_layout(xaxis_title="จำนวนเคส", yaxis_title=None, showlegend=False)
+
+    # One bubble per score pair (agg['risk_cells']), so the chart stays small at any N
+    fig_scatter = risk_matrix_figure(agg['risk_cells'], rules)
+
+    df_progress = pd.DataFrame(PROGRESS_DATA).iloc[::-1]
+    fig_prog = px.bar(df_progress, x='Progress', y='Task', text='Progress', orientation='h',
+                      color_discrete_sequence=['#10b981'])
+    fig_prog.update_traces(texttemplate='%{text}%', textposition='inside')
+    make_static(fig_prog)
+    fig_prog.update_layout(
+        xaxis_title="ความสำเร็จ (%)", yaxis_title=None,
+        xaxis=dict(range=[0, 105], showgrid=True),
+        height=400, margin=dict(l=0, r=0, t=0, b=0)
+    )
+
+    return {
+        'village': fig_village, 'sex': fig_sex, 'mobility': fig_mob, 'adl': fig_adl,
+        'risk': fig_risk, 'scatter': fig_scatter, 'progress': fig_prog,
+    }
+
+
+def risk_matrix_figure(cells, rules):
+    """ADL vs home-risk matrix from agg['risk_cells']: one bubble per score pair, sized by patient count."""
+    fig = px.scatter(cells, x='ADL_Score', y='Env_Risk_Score', size='Count', color='Env_Risk_Score',
+                     color_continuous_scale='Reds', size_max=30, hover_data=['Count'],
+                     labels={'ADL_Score': 'คะแนนสุขภาพ (ADL)', 'Env_Risk_Score': 'คะแนนความเสี่ยงบ้าน', 'Count': 'จำนวน'})
+    fig.add_shape(type="rect", x0=0, y0=rules['risky_home']['risk_at_least'], x1=rules['critical']['adl_below'], y1=10, line=dict(color="Red", width=2, dash="dash"))
+    fig.add_annotation(x=rules['critical']['adl_below'] / 2, y=9.5, text="CRITICAL ZONE", showarrow=False, font=dict(color="red", size=14))
+    make_static(fig)
+    fig.update_xaxes(range=[-1, 21])
+    fig.update_yaxes(range=[-1, 11])
+    return fig
+
+
+# --- FINANCE DASHBOARD (np.py) ---
+def ledger_figures(agg):
+    fig_burn = go.Figure()
+    fig_burn.add_trace(go.Scatter(y=agg['running']['Run_Balance'], mode='lines', fill='tozeroy', name='คงเหลือ', line=dict(color='#2563eb')))
+    fig_burn.update_layout(height=300, margin=dict(t=20, b=20), xaxis_title="ลำดับการเบิกจ่าย", yaxis_title="บาท")
+
+    fig_pie = px.pie(agg['cat_sum'], values='Expense', names='Category', hole=0.5, color_discrete_sequence=px.colors.qualitative.Set2)
+    fig_pie.update_layout(height=300, margin=dict(t=20, b=20), showlegend=False)
+    fig_pie.update_traces(textposition='inside', textinfo='percent+label')
+
+    fig_daily = px.bar(agg['daily_sum'], x='Date_Group', y='Expense', text='Expense', color='Expense', color_continuous_scale='Reds')
+    fig_daily.update_traces(texttemplate='฿%{text:,.0f}', textposition='outside')
+    fig_daily.update_layout(height=350, xaxis_title=None, yaxis_title="บาท", showlegend=False)
+
+    fig_cum = go.Figure()
+    fig_cum.add_trace(go.Scatter(y=agg['running']['Cumulative'], mode='lines+markers', name='สะสม', line=dict(color='#ef4444', width=3)))
+    fig_cum.update_layout(height=350, xaxis_title="ลำดับรายการ", yaxis_title="บาทสะสม")
+
+    fig_top = px.bar(agg['top_10'], x='Expense', y='Item', orientation='h', text='Expense', color='Expense', color_continuous_scale='Viridis')
+    fig_top.update_layout(yaxis=dict(autorange="reversed"), xaxis_title="จำนวนเงิน (บาท)", height=400)
+    fig_top.update_traces(texttemplate='฿%{text:,.0f}', textposition='outside')
+
+    return {'burn': fig_burn, 'pie': fig_pie, 'daily': fig_daily, 'cumulative': fig_cum, 'top': fig_top}
+
+
+# --- ADL ITEM ANALYTICS (adlItems.py) ---
+def adl_item_figures(analysis):
+    """Charts for the item-level view, from adl_analysis.analyze()."""
+    dist = analysis['distribution'].copy()
+    dist['Score'] = dist['Score'].astype(str)
+    fig_dist = px.bar(dist, x='Count', y='Item', color='Score', orientation='h', text='Count',
+                      color_discrete_sequence=px.colors.sequential.RdBu)
+    make_static(fig_dist)
+    fig_dist.update_layout(barmode='stack', barnorm='percent', xaxis_title="สัดส่วนผู้ป่วย (%)", yaxis_title=None,
+                           yaxis=dict(autorange="reversed"), legend_title="คะแนน")
+
+    def faceted(table, wrap=4):
+        # Same stacked bars as fig_dist, one panel per village / ADL group
+        table = table.copy()
+        table['Score'] = table['Score'].astype(str)
+        n_rows = -(-table['Group'].nunique() // wrap)
+        fig = px.bar(table, x='Count', y='Item', color='Score', orientation='h', facet_col='Group',
+                     facet_col_wrap=wrap, facet_row_spacing=0.12 / max(n_rows, 1),
+                     category_orders={'Group': list(pd.unique(table['Group']))},
+                     color_discrete_sequence=px.colors.sequential.RdBu)
+        make_static(fig)
+        fig.for_each_annotation(lambda a: a.update(text=a.text.split('=', 1)[-1]))
+        fig.update_layout(barmode='stack', barnorm='percent', height=320 * n_rows, legend_title="คะแนน")
+        fig.update_xaxes(title=None)
+        fig.update_yaxes(title=None, autorange="reversed")
+        return fig
+
+    def heatmap(table):
+        fig = px.imshow(table.drop(columns='Patients'), text_auto=True, aspect='auto',
+                        color_continuous_scale='RdYlGn', zmin=0, zmax=100)
+        make_static(fig)
+        fig.update_layout(xaxis_title=None, yaxis_title=None, coloraxis_colorbar_title="% ของคะแนนเต็ม")
+        return fig
+
+    fig_corr = px.imshow(analysis['correlation'], text_auto=True, aspect='auto',
+                         color_continuous_scale='RdBu', zmin=-1, zmax=1)
+    make_static(fig_corr)
+
+    return {
+        'distribution': fig_dist,
+        'dist_by_village': faceted(analysis['by_village']),
+        'dist_by_group': faceted(analysis['by_group'], wrap=3),
+        'mean_by_village': heatmap(analysis['mean_by_village']),
+        'mean_by_group': heatmap(analysis['mean_by_group']),
+        'correlation': fig_corr,
+    }
+
+
+def forecast_figure(fc, budget):
+    """Actual cumulative spend, projected spend with its band, and the budget line (forecast.forecast())."""
+    fig = go.Figure()
+    proj = fc['projection']
+    if not proj.empty:
+        fig.add_trace(go.Scatter(x=proj['Date'], y=proj['Upper'], mode='lines', line=dict(width=0),
+                                 showlegend=False, hoverinfo='skip'))
+        fig.add_trace(go.Scatter(x=proj['Date'], y=proj['Lower'], mode='lines', line=dict(width=0), fill='tonexty',
+                                 fillcolor='rgba(239, 68, 68, 0.15)', name='ช่วงคาดการณ์ 95%'))
+        fig.add_trace(go.Scatter(x=proj['Date'], y=proj['Projected'], mode='lines', name='คาดการณ์',
+                                 line=dict(color='#ef4444', dash='dash')))
+    hist = fc['history']
+    fig.add_trace(go.Scatter(x=hist['Date'], y=hist['Cumulative'], mode='lines+markers', name='ใช้จริงสะสม',
+                             line=dict(color='#2563eb', width=3)))
+    fig.add_hline(y=budget, line=dict(color='#10b981', dash='dot'), annotation_text="งบประมาณ")
+    fig.update_layout(height=350, xaxis_title=None, yaxis_title="บาทสะสม", margin=dict(t=20, b=20),
+                      yaxis=dict(range=[0, budget * 1.1]))
+    return fig
@@ -0,0 +1,194 @@
+"""
+Budget burn forecast and unusual-expense detection for the finance dashboard.
+
+Spending is modelled per Category as a straight line through the category's
+cumulative spend over time (days since the first dated expense). A fit is
+kept as OLS sufficient statistics (n, Σt, Σt², ΣC, ΣtC, ΣC²) plus the running
+total, so rows appended to the ledger are folded in without revisiting the
+old ones: on each call the cached fit whose rows are a prefix of the current
+ledger is extended with the new rows only. The category slopes add up to the
+project's daily burn rate, and their standard errors give the band around
+the date the budget runs out.
+
+Outliers are flagged per category with the median / MAD robust z-score
+(|z| > 3.5), computed with grouped transforms over the whole ledger at once.
+The scale is floored at the mean absolute deviation and at a share of the
+median, and categories with fewer than OUTLIER_MIN_ROWS rows are not scored:
+a category that is mostly one repeated price (drinks at 630 baht) would
+otherwise have MAD ≈ 0 and flag every other expense in it.
+"""
+import hashlib
+from collections import OrderedDict
+
+import lazy
+import ledger
+
+np = lazy.module('numpy')
+pd = lazy.module('pandas')
+
+Z_BAND = 1.96  # ~95% band
+OUTLIER_Z = 3.5
+OUTLIER_MIN_ROWS = 5
+OUTLIER_MIN_SCALE = 0.1  # of the category median
+_STATS = ['n', 't', 'tt', 'c', 'tc', 'cc']
+_CACHE_SIZE = 8
+_fits = OrderedDict()
+
+
+# --- INCREMENTAL FIT ---
+def _rows(table):
+    """Ledger rows (aggregates.LEDGER_TABLE_COLUMNS) -> Date, Category, Expense in ledger order."""
+    item, date_group, category, amount = table.columns[:4]
+    rows = pd.DataFrame({
+        'Item': table[item].to_numpy(),
+        'Date': ledger.parse_date_group(table[date_group]).to_numpy(),
+        'Category': table[category].to_numpy(),
+        'Expense': table[amount].to_numpy(dtype=float),
+    })
+    rows['Date'] = rows['Date'].bfill()  # rows before the first date header
+    return rows
+
+
+def _digest(hashes):
+    return hashlib.sha1(hashes.tobytes()).hexdigest()
+
+
+def _new_fit(t0):
+    return {'t0': t0, 'rows': 0, 'stats': pd.DataFrame(columns=_STATS, dtype=float), 'last': pd.Series(dtype=float)}
+
+
+def _extend(fit, rows):
+    """Folds `rows` (appended after the ones already in `fit`) into the sufficient statistics."""
+    if rows.empty:
+        return fit
+    t = (rows['Date'] - fit['t0']).dt.days.to_numpy(dtype=float)
+    prev = rows['Category'].map(fit['last']).fillna(0).to_numpy()
+    c = rows.groupby('Category', sort=False)['Expense'].cumsum().to_numpy() + prev
+    batch = pd.DataFrame({'n': 1.0, 't': t, 'tt': t * t, 'c': c, 'tc': t * c, 'cc': c * c,
+                          'Category': rows['Category'].to_numpy()})
+    stats = fit['stats'].add(batch.groupby('Category').sum(), fill_value=0)
+    last = pd.Series(c, index=rows['Category'].to_numpy()).groupby(level=0).last()
+    return {
+        't0': fit['t0'],
+        'rows': fit['rows'] + len(rows),
+        'stats': stats,
+        'last': last.combine_first(fit['last']),
+    }
+
+
+def fit(rows):
+    """
+    Sufficient statistics for `rows`, reusing the cached fit of the longest
+    prefix seen before (the ledger is append-only in practice).
+    """
+    hashes = pd.util.hash_pandas_object(rows, index=False).to_numpy()
+    best = None
+    for key, cached in reversed(_fits.items()):
+        n = cached['rows']
+        if n <= len(rows) and (best is None or n > best['rows']) and _digest(hashes[:n]) == key:
+            best = cached
+    if best is None:
+        t0 = rows['Date'].min()
+        best = _new_fit(t0 if pd.notna(t0) else pd.Timestamp('today').normalize())
+    result = _extend(best, rows.iloc[best['rows']:])
+
+    _fits[_digest(hashes)] = result
+    _fits.move_to_end(_digest(hashes))
+    if len(_fits) > _CACHE_SIZE:
+        _fits.popitem(last=False)
+    return result
+
+
+# --- FORECAST ---
+def category_rates(fit, elapsed_days):
+    """Daily spend rate (slope) and its standard error per category."""
+    s = fit['stats']
+    sxx = s['tt'] - s['t'] ** 2 / s['n']
+    sxy = s['tc'] - s['t'] * s['c'] / s['n']
+    syy = s['cc'] - s['c'] ** 2 / s['n']
+    ok = (s['n'] >= 3) & (sxx > 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        slope = sxy / sxx
+        sse = (syy - slope * sxy).clip(lower=0)
+        se = np.sqrt(sse / (s['n'] - 2) / sxx)
+    # Too few dated points for a line: spread what was spent over the elapsed days, fully uncertain
+    flat = fit['last'].reindex(s.index) / max(elapsed_days, 1)
+    rate = slope.where(ok, flat).clip(lower=0)
+    rate_se = se.where(ok, flat)
+    return pd.DataFrame({
+        'Category': s.index,
+        'Spent': fit['last'].reindex(s.index).to_numpy(),
+        'Rate_per_day': rate.to_numpy(),
+        'Rate_SE': rate_se.to_numpy(),
+        'Points': s['n'].astype(int).to_numpy(),
+    }).sort_values('Spent', ascending=False, kind='stable').reset_index(drop=True)
+
+
+def forecast(budget, table, z=Z_BAND):
+    """
+    Projects when the budget runs out. `table` is the ledger table from
+    aggregates / store (LEDGER_TABLE_COLUMNS).
+    """
+    rows = _rows(table)
+    f = fit(rows)
+    last_date = rows['Date'].max() if len(rows) else f['t0']
+    elapsed = (last_date - f['t0']).days + 1
+    rates = category_rates(f, elapsed)
+    spent = float(rows['Expense'].sum())
+    remaining = float(budget) - spent
+    rate = float(rates['Rate_per_day'].sum())
+    rate_se = float(np.sqrt((rates['Rate_SE'] ** 2).sum()))
+
+    history = rows.groupby('Date')['Expense'].sum().cumsum().rename('Cumulative').reset_index()
+    result = {
+        'spent': spent, 'remaining': remaining, 'rate': rate, 'rate_se': rate_se,
+        'last_date': last_date, 'by_category': rates, 'history': history, 'exhausted': remaining <= 0,
+        'exhaust_date': None, 'exhaust_early': None, 'exhaust_late': None,
+    }
+    if remaining <= 0:
+        # Already spent: the date the running total first reached the budget
+        crossed = rows['Expense'].cumsum().to_numpy() >= budget
+        result['exhaust_date'] = rows['Date'].iloc[int(np.argmax(crossed))] if crossed.any() else last_date
+        result['projection'] = pd.DataFrame(columns=['Date', 'Projected', 'Lower', 'Upper'])
+        return result
+
+    def days_to(r):
+        return remaining / r if r > 0 else np.inf
+    mid, early, late = days_to(rate), days_to(rate + z * rate_se), days_to(rate - z * rate_se)
+    to_date = lambda d: last_date + pd.Timedelta(days=float(np.ceil(d))) if np.isfinite(d) else None
+    result['exhaust_date'], result['exhaust_early'], result['exhaust_late'] = to_date(mid), to_date(early), to_date(late)
+
+    # Chart runs to the late end of the band (or 2x the central estimate), at most 10 years
+    horizon = late if np.isfinite(late) else 2 * mid if np.isfinite(mid) else 365
+    d = np.arange(int(np.ceil(min(horizon, 3650))) + 1, dtype=float)
+    result['projection'] = pd.DataFrame({
+        'Date': last_date + pd.to_timedelta(d, unit='D'),
+        'Projected': spent + rate * d,
+        'Lower': spent + np.clip(rate - z * rate_se, 0, None) * d,
+        'Upper': spent + (rate + z * rate_se) * d,
+    })
+    return result
+
+
+# --- UNUSUAL EXPENSES ---
+def outliers(table, threshold=OUTLIER_Z, min_rows=OUTLIER_MIN_ROWS):
+    """
+    Robust z-score of each expense within its category, (x - median) / scale
+    with scale = max(1.4826 * MAD, 1.2533 * mean absolute deviation from the
+    mean, OUTLIER_MIN_SCALE * median); categories with fewer than `min_rows`
+    expenses get 0. Returns the flagged rows, most extreme first.
+    """
+    rows = _rows(table)
+    by = rows.groupby('Category')['Expense']
+    median = by.transform('median')
+    dev = (rows['Expense'] - median).abs()
+    mad = dev.groupby(rows['Category']).transform('median')
+    mean_ad = (rows['Expense'] - by.transform('mean')).abs().groupby(rows['Category']).transform('mean')
+    scale = np.maximum.reduce([1.4826 * mad, 1.253314 * mean_ad, OUTLIER_MIN_SCALE * median.abs()])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z = np.where(by.transform('size') >= min_rows, (rows['Expense'] - median) / scale, 0.0)
+    rows['Median'] = median
+    rows['Robust_Z'] = np.round(np.nan_to_num(z, nan=0.0, posinf=0.0, neginf=0.0), 2)
+    flagged = rows[np.abs(rows['Robust_Z']) > threshold]
+    return flagged.reindex(flagged['Robust_Z'].abs().sort_values(ascending=False, kind='stable').index) \
+        .reset_index(drop=True)
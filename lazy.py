@@ -0,0 +1,127 @@
+"""
+Deferred imports for the heavy libraries, and an import-time profile.
+
+    pd = lazy.module('pandas')
+
+binds `pd` to a stand-in that imports pandas on the first attribute access
+(pd.DataFrame, ...), so a page that stops early (missing file, error banner)
+or takes the snapshot path never pays for pandas / plotly.express / openpyxl.
+Streamlit keeps modules in sys.modules, so the cost is paid at most once per
+process, on the first run that actually needs the library.
+
+    python lazy.py profile [page.py ...] [--top 15]
+
+starts a fresh interpreter per page, imports streamlit (already loaded in a
+running server) and then the page's own imports under `python -X importtime`,
+and reports the extra startup cost per module. With --run it also times the
+page's first full run (AppTest) and lists which heavy libraries it loaded.
+"""
+import argparse
+import ast
+import importlib
+import os
+import subprocess
+import sys
+
+HEAVY = ['pandas', 'numpy', 'plotly.express', 'plotly.io', 'openpyxl', 'sqlite3', 'pyarrow']
+PAGES = ['test.py', 'backup.py', 'np.py', 'onlyList.py', 'dashboard.py', 'adlItems.py', 'visitPlan.py']
+
+
+# --- LOADER ---
+class LazyModule:
+    """Stands in for a module until the first attribute access imports it."""
+
+    def __init__(self, name):
+        self.__dict__['_lazy_name'] = name
+
+    def __getattr__(self, attr):
+        # importlib holds the per-module import lock, so concurrent sessions import once
+        value = getattr(importlib.import_module(self._lazy_name), attr)
+        self.__dict__[attr] = value  # later lookups skip __getattr__
+        return value
+
+    def __repr__(self):
+        state = 'loaded' if self._lazy_name in sys.modules else 'not loaded'
+        return f"<lazy module '{self._lazy_name}' ({state})>"
+
+
+def module(name):
+    """The module itself if something already imported it, else a LazyModule."""
+    return sys.modules.get(name) or LazyModule(name)
+
+
+# --- PROFILE ---
+def page_imports(path):
+    """The import statements at the top level of a page, as source."""
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), path)
+    return '\n'.join(ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+def parse_importtime(stderr):
+    """`-X importtime` lines -> [(module, self µs, cumulative µs, depth)]."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative), depth))
+    return rows
+
+
+def import_profile(path, baseline='import streamlit'):
+    """Extra import cost of a page on top of `baseline`. Returns (total µs, rows)."""
+    code = f"{baseline}\nimport sys\nsys.stderr.write('--- page ---\\n')\n{page_imports(path)}"
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(path)) or '.')
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    rows = parse_importtime(result.stderr.split('--- page ---\n', 1)[1])
+    return sum(r[1] for r in rows), rows
+
+
+_RUN = """
+import sys, time
+import streamlit
+from streamlit.testing.v1 import AppTest
+t = time.perf_counter()
+AppTest.from_file({path!r}, default_timeout=120).run()
+print(round(time.perf_counter() - t, 3))
+print(','.join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+
+def run_profile(path):
+    """First full run of a page in a fresh process: (seconds, heavy modules loaded)."""
+    result = subprocess.run([sys.executable, '-c', _RUN.format(path=os.path.abspath(path), heavy=HEAVY)],
+                            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(path)) or '.')
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    seconds, loaded = result.stdout.strip().splitlines()[-2:]
+    return float(seconds), [m for m in loaded.split(',') if m]
+
+
+# --- CLI ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import-time profile of the dashboard pages")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_prof = sub.add_parser('profile', help="startup cost per module, on top of streamlit")
+    p_prof.add_argument('pages', nargs='*', default=PAGES)
+    p_prof.add_argument('--top', type=int, default=10, help="modules to list per page")
+    p_prof.add_argument('--run', action='store_true', help="also time the first full run of each page")
+    args = parser.parse_args(argv)
+
+    for page in args.pages:
+        total, rows = import_profile(page)
+        print(f"{page}: imports {total / 1000:.1f} ms on top of streamlit")
+        # Cumulative cost of each top-level import the page triggers, heaviest first
+        for name, _, cumulative, _ in sorted((r for r in rows if r[3] == 0), key=lambda r: -r[2])[:args.top]:
+            print(f"  {cumulative / 1000:8.1f} ms  {name}")
+        if args.run:
+            seconds, loaded = run_profile(page)
+            print(f"  first run {seconds:.2f} s, loaded: {', '.join(loaded) or '-'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+import lazy
+
+pd = lazy.module('pandas')
+
+LEDGER_PATH = 'payment.xlsx'
+
+THAI_MONTHS = ['ม.ค.', 'ก.พ.', 'มี.ค.', 'เม.ย.', 'พ.ค.', 'มิ.ย.', 'ก.ค.', 'ส.ค.', 'ก.ย.', 'ต.ค.', 'พ.ย.', 'ธ.ค.']
+
+
+def categorize(i):
+    i = str(i).lower()
+    if any(x in i for x in ['อาหาร', 'เบรก', 'น้ำดื่ม', 'กาแฟ']): return 'ค่าอาหาร/เครื่องดื่ม'
+    if any(x in i for x in ['เบี้ยเลี้ยง', 'ประชุม', 'วิทยากร', 'คณะทำงาน']): return 'ค่าตอบแทน/เบี้ยเลี้ยง'
+    if any(x in i for x in ['เช่า', 'อุปกรณ์', 'วัสดุ']): return 'ค่าวัสดุ/อุปกรณ์'
+    if any(x in i for x in ['ปักหมุด', 'สำรวจ', 'ลงพื้นที่']): return 'ค่าเดินทาง/ลงพื้นที่'
+    if any(x in i for x in ['gemini', 'canva', 'รูปเล่ม', 'dadbord']): return 'ซอฟต์แวร์/รายงาน'
+    return 'อื่นๆ'
+
+
+def parse_date_group(date_groups):
+    """
+    "วันที่ 12 ธ.ค.68" -> 2025-12-12 (Buddhist-era year, 2 or 4 digits). Rows without a
+    date header inherit the previous date; NaT only before the first one.
+    """
+    codes, uniques = pd.factorize(pd.Series(date_groups).astype(str))
+    parts = pd.Series(uniques).str.extract(r'(\d{1,2})\s*([^\d\s]+?)\s*(\d{2,4})\s*$')
+    month = parts[1].str.replace(' ', '').map({m: i + 1 for i, m in enumerate(THAI_MONTHS)})
+    year = pd.to_numeric(parts[2], errors='coerce')
+    year = year.where(year > 100, year + 2500) - 543
+    parsed = pd.to_datetime(pd.DataFrame({'year': year, 'month': month, 'day': pd.to_numeric(parts[0])}),
+                            errors='coerce')
+    dates = pd.Series(parsed.to_numpy()[codes], index=getattr(date_groups, 'index', None))
+    return dates.ffill()
+
+
+def load_ledger(path=LEDGER_PATH):
+    """
+    Reads the finance workbook and returns (budget, expense rows).
+    Raises whatever pandas raises when the file is missing or unreadable.
+    """
+    df = pd.read_excel(path, header=1)
+
+    # Clean & Rename
+    df.columns = df.columns.str.strip()
+    col_map = {'รายการ': 'Item', 'รายรับ': 'Income', 'รายจ่าย': 'Expense', 'คงเหลือ': 'Balance'}
+    df = df.rename(columns=col_map)
+
+    # Numeric Conversion
+    for c in ['Income', 'Expense', 'Balance']:
+        df[c] = pd.to_numeric(df[c].astype(str).str.replace(',', ''), errors='coerce').fillna(0)
+
+    df = df.dropna(subset=['Item'])
+
+    # --- LOGIC 1: EXTRACT DATE FROM ITEM ---
+    # We look for rows starting with "วันที่" and propagate that date down to subsequent rows
+    df['Date_Group'] = df['Item'].where(df['Item'].astype(str).str.startswith('วันที่'))
+    df['Date_Group'] = df['Date_Group'].ffill() # Forward fill the date
+    df['Date_Group'] = df['Date_Group'].fillna('ค่าใช้จ่ายอื่นๆ (Start)') # Handle initial rows
+
+    # --- LOGIC 2: BUDGET & CATEGORY ---
+    funding_row = df[df['Item'].str.contains('รับเงิน', na=False)].head(1)
+    budget = funding_row['Income'].values[0] if not funding_row.empty else df['Income'].max()
+
+    # Filter only actual expense rows (exclude the Date Header rows which usually have 0 expense)
+    df_expenses = df[df['Expense'] > 0].copy()
+    df_expenses['Category'] = df_expenses['Item'].apply(categorize)
+
+    return budget, df_expenses
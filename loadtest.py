@@ -0,0 +1,201 @@
+"""
+Concurrent-session load test for the Streamlit entry points.
+
+    python loadtest.py --sessions 8 --reruns 5 --rows 20000 --ledger-rows 500
+
+generates a synthetic survey export / finance workbook of the requested size
+in a scratch directory, then drives N headless sessions of each app through
+streamlit.testing (no browser, no server). All sessions share one process,
+and therefore one st.cache_data, the same way they would on a single pod.
+Reports p50/p95/p99 rerun latency, CPU use and memory growth per session.
+"""
+import argparse
+import gc
+import os
+import random
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import shared
+import snapshot
+import store
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+APPS = ['test.py', 'backup.py', 'np.py', 'onlyList.py', 'adlItems.py', 'visitPlan.py']
+
+# --- SYNTHETIC DATA ---
+_FIRST = ['สมชาย', 'สมศรี', 'บุญมี', 'แก้ว', 'คำ', 'จันทร์', 'ศรีนวล', 'ประเสริฐ', 'บัวผัน', 'อำพร']
+_LAST = ['ใจดี', 'กันตี', 'คำสา', 'ไชยแสน', 'ใจสุข', 'คะเน', 'ทองดี', 'มณีวรรณ']
+_PREFIX = ['นาย', 'นาง', 'นางสาว']
+_ADDRESS = ['{n}/{s} หมู่ {m} ต.สันกลาง อ.สันกำแพง จ.เชียงใหม่', '{n} ม.{m} ต.สันกลาง อ.สันกำแพง จ.เชียงใหม่',
+            '{n}/{s} ม. {m} ต.สันกลาง อ.สันกำแพง จ.เชียงใหม่', '{n} ต.สันกลาง อ.สันกำแพง จ.เชียงใหม่']
+_ADL_MAX = [2, 1, 3, 2, 3, 2, 2, 1, 2, 2]
+_LEDGER_ITEMS = ['น้ำดื่ม กาแฟ ชา แก้ว', 'ค่าอาหาร+เบรก', 'ค่าเบี้ยเลี้ยงประชุมคณะทำงาน', 'ค่าเบี้ยเลี้ยงวิทยากร',
+                 'ค่าวัสดุอุปกรณ์สำนักงาน', 'ค่าปักหมุด+กรอกข้อมูล', 'ค่าเดินทางลงพื้นที่สำรวจ', 'ค่า AI Gemini + Canva']
+
+
+def synthetic_survey(n_rows, header, seed=0):
+    rng = np.random.default_rng(seed)
+    pick = lambda options, size=n_rows: np.asarray(options, dtype=object)[rng.integers(0, len(options), size)]
+    data = {}
+    day = rng.integers(1, 28, n_rows)
+    data[header[0]] = [f"{d}/1/2026, {h}:{m:02d}:{s:02d}" for d, h, m, s in
+                       zip(day, rng.integers(7, 18, n_rows), rng.integers(0, 60, n_rows), rng.integers(0, 60, n_rows))]
+    data[header[1]] = pick(_PREFIX) + pick(_FIRST) + ' ' + pick(_LAST)
+    data[header[2]] = [pick(_ADDRESS, 1)[0].format(n=n, s=s, m=m) for n, s, m in
+                       zip(rng.integers(1, 200, n_rows), rng.integers(1, 9, n_rows), rng.integers(1, 12, n_rows))]
+    data[header[3]] = [f"0{a}-{b:03d}-{c:04d}" for a, b, c in
+                       zip(rng.integers(61, 99, n_rows), rng.integers(0, 1000, n_rows), rng.integers(0, 10000, n_rows))]
+    data[header[4]] = '-'
+    data[header[5]] = '-'
+    for col in header[6:16]:
+        data[col] = pick(['ใช่', 'ไม่ใช่'])
+    for col, top in zip(header[16:26], _ADL_MAX):
+        data[col] = [f"{v}. คำตอบระดับ {v}" for v in rng.integers(0, top + 1, n_rows)]
+    for col in header[26:]:
+        data[col] = ''
+    return pd.DataFrame(data, columns=header)
+
+
+def synthetic_ledger(n_rows, seed=0):
+    rng = random.Random(seed)
+    rows = [[1, 'รับเงิน สสส.', 100000 * max(1, n_rows // 20), 0, 0, None]]
+    seq = 1
+    for i in range(n_rows):
+        if i % 4 == 0:
+            seq += 1
+            rows.append([seq, f"วันที่ {rng.randint(1, 28)} ธ.ค.68", 0, 0, 0, None])
+        rows.append([None, rng.choice(_LEDGER_ITEMS), 0, rng.randint(100, 5000), 0, None])
+    return pd.DataFrame(rows, columns=['ลำดับ', 'รายการ', 'รายรับ', 'รายจ่าย', 'คงเหลือ', 'หมายเหตุ'])
+
+
+def prepare_workdir(n_rows, n_ledger, mode, template='file.csv'):
+    """Scratch directory laid out like the repo root, with synthetic inputs."""
+    workdir = tempfile.mkdtemp(prefix='stroke-loadtest-')
+    header = list(pd.read_csv(os.path.join(REPO_DIR, template), nrows=0).columns)
+    synthetic_survey(n_rows, header).to_csv(os.path.join(workdir, 'file.csv'), index=False)
+    synthetic_ledger(n_ledger).to_excel(os.path.join(workdir, 'payment.xlsx'), startrow=1, index=False)
+    shutil.copy(os.path.join(REPO_DIR, 'rules.json'), workdir)
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        if mode == 'store':
+            store.ingest('stroke.db')
+        elif mode == 'snapshot':
+            snapshot.build('snapshots')
+    finally:
+        os.chdir(cwd)
+    return workdir
+
+
+# --- MEASUREMENT ---
+def rss_mb():
+    gc.collect()
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _interact(at, rng):
+    """Changes one widget at random, like a user poking at the page."""
+    widgets = list(at.selectbox) + list(at.radio) + list(at.multiselect) + list(at.checkbox)
+    if not widgets:
+        return
+    w = rng.choice(widgets)
+    if hasattr(w, 'options') and w.options:
+        if w.type == 'multiselect':
+            w.set_value(rng.sample(list(w.options), rng.randint(0, len(w.options))))
+        else:
+            w.set_value(rng.choice(list(w.options)))
+    elif w.type == 'checkbox':
+        w.set_value(not w.value)
+
+
+def run_session(app, reruns, timeout, seed):
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed)
+    at = AppTest.from_file(os.path.join(REPO_DIR, app), default_timeout=timeout)
+    latencies, errors = [], 0
+    for i in range(reruns):
+        if i > 0:
+            _interact(at, rng)
+        start = time.perf_counter()
+        at.run()
+        latencies.append(time.perf_counter() - start)
+        errors += len(at.exception)
+    return latencies, errors
+
+
+def load_app(app, sessions, reruns, timeout):
+    rss_before = rss_mb()
+    cpu_before = time.process_time()
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        results = list(pool.map(lambda i: run_session(app, reruns, timeout, i), range(sessions)))
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_before
+    rss_growth = rss_mb() - rss_before
+
+    latencies = np.array([t for lat, _ in results for t in lat]) * 1000
+    first = np.array([lat[0] for lat, _ in results]) * 1000
+    return {
+        'app': app,
+        'sessions': sessions,
+        'reruns': len(latencies),
+        'errors': sum(err for _, err in results),
+        'first_ms': round(float(first.max()), 1),
+        'p50_ms': round(float(np.percentile(latencies, 50)), 1),
+        'p95_ms': round(float(np.percentile(latencies, 95)), 1),
+        'p99_ms': round(float(np.percentile(latencies, 99)), 1),
+        'cpu_s': round(cpu, 2),
+        'cpu_pct': round(100 * cpu / wall, 1),
+        'rss_growth_mb': round(rss_growth, 1),
+        'mb_per_session': round(rss_growth / sessions, 2),
+    }
+
+
+# --- CLI ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless concurrent-session load test for the dashboards")
+    parser.add_argument('--apps', nargs='+', default=APPS)
+    parser.add_argument('--sessions', type=int, default=8)
+    parser.add_argument('--reruns', type=int, default=5, help="reruns per session (first one is the cold load)")
+    parser.add_argument('--rows', type=int, default=5000, help="synthetic survey rows")
+    parser.add_argument('--ledger-rows', type=int, default=200, help="synthetic ledger expense rows")
+    parser.add_argument('--mode', choices=['raw', 'store', 'snapshot'], default='raw',
+                        help="data path the apps take: raw files, SQLite store or prebuilt snapshot")
+    parser.add_argument('--timeout', type=float, default=120)
+    parser.add_argument('--csv-out', help="also write the results table to this CSV file")
+    parser.add_argument('--keep', action='store_true', help="keep the scratch directory")
+    args = parser.parse_args(argv)
+
+    workdir = prepare_workdir(args.rows, args.ledger_rows, args.mode)
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    # The apps open file.csv / stroke.db / snapshots relative to the working directory
+    try:
+        report = pd.DataFrame([load_app(app, args.sessions, args.reruns, args.timeout) for app in args.apps])
+    finally:
+        # Raw mode published the synthetic frames into /dev/shm: don't leave them behind
+        shared.release(os.path.join(workdir, 'file.csv'), os.path.join(workdir, 'payment.xlsx'))
+        os.chdir(cwd)
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"rows={args.rows} ledger_rows={args.ledger_rows} mode={args.mode}")
+    print(report.to_string(index=False))
+    if args.csv_out:
+        report.to_csv(args.csv_out, index=False)
+
+
+if __name__ == '__main__':
+    main()
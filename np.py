@@ -1,8 +1,13 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-import re
+
+import aggregates
+import export
+import figures
+import forecast
+import ledger
+import shared
+import snapshot
+import store
 
 # --- 1. PAGE CONFIGURATION ---
 st.set_page_config(
@@ -60,60 +65,47 @@ st.markdown("""
 @st.cache_data
 def load_data():
     try:
-        df = pd.read_excel('payment.xlsx', header=1)
+        # Parsed once per host and shared between worker processes (see shared.py)
+        budget, df_expenses = shared.expense_ledger()
     except:
-        return None, "File not found"
+        return None
 
-    # Clean & Rename
-    df.columns = df.columns.str.strip()
-    col_map = {'รายการ': 'Item', 'รายรับ': 'Income', 'รายจ่าย': 'Expense', 'คงเหลือ': 'Balance'}
-    df = df.rename(columns=col_map)
-    
-    # Numeric Conversion
-    for c in ['Income', 'Expense', 'Balance']:
-        df[c] = pd.to_numeric(df[c].astype(str).str.replace(',', ''), errors='coerce').fillna(0)
-    
-    df = df.dropna(subset=['Item'])
-    
-    # --- LOGIC 1: EXTRACT DATE FROM ITEM ---
-    # We look for rows starting with "วันที่" and propagate that date down to subsequent rows
-    df['Date_Group'] = df['Item'].apply(lambda x: x if str(x).startswith('วันที่') else None)
-    df['Date_Group'] = df['Date_Group'].ffill() # Forward fill the date
-    df['Date_Group'] = df['Date_Group'].fillna('ค่าใช้จ่ายอื่นๆ (Start)') # Handle initial rows
-
-    # --- LOGIC 2: BUDGET & CATEGORY ---
-    funding_row = df[df['Item'].str.contains('รับเงิน', na=False)].head(1)
-    budget = funding_row['Income'].values[0] if not funding_row.empty else df['Income'].max()
-    
-    def categorize(i):
-        i = str(i).lower()
-        if any(x in i for x in ['อาหาร', 'เบรก', 'น้ำดื่ม', 'กาแฟ']): return 'ค่าอาหาร/เครื่องดื่ม'
-        if any(x in i for x in ['เบี้ยเลี้ยง', 'ประชุม', 'วิทยากร', 'คณะทำงาน']): return 'ค่าตอบแทน/เบี้ยเลี้ยง'
-        if any(x in i for x in ['เช่า', 'อุปกรณ์', 'วัสดุ']): return 'ค่าวัสดุ/อุปกรณ์'
-        if any(x in i for x in ['ปักหมุด', 'สำรวจ', 'ลงพื้นที่']): return 'ค่าเดินทาง/ลงพื้นที่'
-        if any(x in i for x in ['gemini', 'canva', 'รูปเล่ม', 'dadbord']): return 'ซอฟต์แวร์/รายงาน'
-        return 'อื่นๆ'
-    
-    # Filter only actual expense rows (exclude the Date Header rows which usually have 0 expense)
-    df_expenses = df[df['Expense'] > 0].copy()
-    df_expenses['Category'] = df_expenses['Item'].apply(categorize)
-    
-    return budget, df_expenses
+    return aggregates.ledger_aggregates(budget, df_expenses)
 
-data = load_data()
-if data[0] is None:
-    st.error("Error loading data.")
-    st.stop()
+# When `python store.py ingest` has built the database, aggregate in SQL instead
+@st.cache_data
+def load_from_store(db_version):
+    conn = store.connect()
+    agg = store.ledger_aggregates(conn)
+    conn.close()
+    return agg
 
-total_budget, df_exp = data
-total_spend = df_exp['Expense'].sum()
-balance = total_budget - total_spend
-burn_rate = (total_spend / total_budget) * 100
+# Precomputed by `python snapshot.py build`: no parsing or chart building at request time
+@st.cache_data
+def load_snapshot(version):
+    return snapshot.load_aggregates(version, 'ledger'), snapshot.load_figures(version, 'ledger')
 
-# Prepare Data for Charts
-df_exp = df_exp.reset_index(drop=True)
-df_exp['Cumulative'] = df_exp['Expense'].cumsum()
-df_exp['Run_Balance'] = total_budget - df_exp['Cumulative']
+# Refits only the rows appended since the last call (see forecast.py); the table isn't hashed
+@st.cache_data
+def load_forecast(budget, data_version, _table):
+    return forecast.forecast(budget, _table), forecast.outliers(_table)
+
+snapshot_version = snapshot.latest()
+if snapshot_version is not None:
+    agg, figs = load_snapshot(snapshot_version)
+    data_version = snapshot_version
+else:
+    agg = load_from_store(store.version()) if store.available() else load_data()
+    if agg is None:
+        st.error("Error loading data.")
+        st.stop()
+    figs = figures.ledger_figures(agg)
+    data_version = store.version() if store.available() else shared.file_version(ledger.LEDGER_PATH)
+
+total_budget = agg['budget']
+total_spend = agg['spend']
+balance = agg['balance']
+burn_rate = agg['burn_rate']
 
 # --- 4. DASHBOARD LAYOUT ---
 
@@ -129,7 +121,7 @@ def card(label, val, color):
 with c1: st.markdown(card("งบประมาณรวม", f"฿{total_budget:,.0f}", "#2563eb"), unsafe_allow_html=True)
 with c2: st.markdown(card("ใช้จ่ายไปแล้ว", f"฿{total_spend:,.0f}", "#ef4444"), unsafe_allow_html=True)
 with c3: st.markdown(card("คงเหลือ", f"฿{balance:,.0f}", "#10b981"), unsafe_allow_html=True)
-with c4: st.markdown(card("จำนวนรายการ", f"{len(df_exp)}", "#64748b"), unsafe_allow_html=True)
+with c4: st.markdown(card("จำนวนรายการ", f"{agg['count']}", "#64748b"), unsafe_allow_html=True)
 
 st.markdown("###")
 
@@ -139,20 +131,13 @@ r1c1, r1c2 = st.columns([2, 1])
 with r1c1:
     st.markdown('<div class="chart-container">', unsafe_allow_html=True)
     st.subheader("กราฟแสดงงบประมาณคงเหลือ (Burndown)")
-    fig_burn = go.Figure()
-    fig_burn.add_trace(go.Scatter(y=df_exp['Run_Balance'], mode='lines', fill='tozeroy', name='คงเหลือ', line=dict(color='#2563eb')))
-    fig_burn.update_layout(height=300, margin=dict(t=20, b=20), xaxis_title="ลำดับการเบิกจ่าย", yaxis_title="บาท")
-    st.plotly_chart(fig_burn, use_container_width=True)
+    st.plotly_chart(figs['burn'], use_container_width=True)
     st.markdown('</div>', unsafe_allow_html=True)
 
 with r1c2:
     st.markdown('<div class="chart-container">', unsafe_allow_html=True)
     st.subheader("สัดส่วนค่าใช้จ่าย")
-    cat_sum = df_exp.groupby('Category')['Expense'].sum().reset_index()
-    fig_pie = px.pie(cat_sum, values='Expense', names='Category', hole=0.5, color_discrete_sequence=px.colors.qualitative.Set2)
-    fig_pie.update_layout(height=300, margin=dict(t=20, b=20), showlegend=False)
-    fig_pie.update_traces(textposition='inside', textinfo='percent+label')
-    st.plotly_chart(fig_pie, use_container_width=True)
+    st.plotly_chart(figs['pie'], use_container_width=True)
     st.markdown('</div>', unsafe_allow_html=True)
 
 # --- ROW 2: NEW CHARTS (Daily Trend & Cumulative) ---
@@ -161,37 +146,66 @@ r2c1, r2c2 = st.columns(2)
 with r2c1:
     st.markdown('<div class="chart-container">', unsafe_allow_html=True)
     st.subheader("ยอดใช้จ่ายรายวัน (Daily Spending)")
-    # Group by the extracted 'Date_Group'
-    daily_sum = df_exp.groupby('Date_Group')['Expense'].sum().reset_index()
-    # Attempt to sort by extracting date text if needed, here usually sorting by appearance is safer for mixed formats
-    fig_daily = px.bar(daily_sum, x='Date_Group', y='Expense', text='Expense', color='Expense', color_continuous_scale='Reds')
-    fig_daily.update_traces(texttemplate='฿%{text:,.0f}', textposition='outside')
-    fig_daily.update_layout(height=350, xaxis_title=None, yaxis_title="บาท", showlegend=False)
-    st.plotly_chart(fig_daily, use_container_width=True)
+    st.plotly_chart(figs['daily'], use_container_width=True)
     st.markdown('</div>', unsafe_allow_html=True)
 
 with r2c2:
     st.markdown('<div class="chart-container">', unsafe_allow_html=True)
     st.subheader("ยอดใช้จ่ายสะสม (Cumulative Spending)")
-    fig_cum = go.Figure()
-    fig_cum.add_trace(go.Scatter(y=df_exp['Cumulative'], mode='lines+markers', name='สะสม', line=dict(color='#ef4444', width=3)))
-    fig_cum.update_layout(height=350, xaxis_title="ลำดับรายการ", yaxis_title="บาทสะสม")
-    st.plotly_chart(fig_cum, use_container_width=True)
+    st.plotly_chart(figs['cumulative'], use_container_width=True)
     st.markdown('</div>', unsafe_allow_html=True)
 
 # --- ROW 3: TOP EXPENSES (Horizontal Bar) ---
 st.markdown('<div class="chart-container">', unsafe_allow_html=True)
 st.subheader("10 อันดับ รายจ่ายสูงสุด (Top Spenders)")
-top_10 = df_exp.sort_values(by='Expense', ascending=False).head(10)
-fig_top = px.bar(top_10, x='Expense', y='Item', orientation='h', text='Expense', color='Expense', color_continuous_scale='Viridis')
-fig_top.update_layout(yaxis=dict(autorange="reversed"), xaxis_title="จำนวนเงิน (บาท)", height=400)
-fig_top.update_traces(texttemplate='฿%{text:,.0f}', textposition='outside')
-st.plotly_chart(fig_top, use_container_width=True)
+st.plotly_chart(figs['top'], use_container_width=True)
+st.markdown('</div>', unsafe_allow_html=True)
+
+# --- ROW 4: FORECAST & UNUSUAL EXPENSES ---
+fc, unusual = load_forecast(total_budget, data_version, agg['ledger_table'])
+fmt_date = lambda d: d.strftime('%d/%m/%Y') if d is not None else "-"
+
+st.markdown('<div class="chart-container">', unsafe_allow_html=True)
+st.subheader("พยากรณ์การใช้งบประมาณ (Forecast)")
+if fc['exhausted']:
+    st.warning(f"งบประมาณถูกใช้หมดแล้วเมื่อ **{fmt_date(fc['exhaust_date'])}**")
+elif fc['exhaust_date'] is None:
+    st.info("ยังไม่มีแนวโน้มการใช้จ่ายเพียงพอสำหรับการพยากรณ์")
+else:
+    st.info(f"คาดว่างบประมาณจะหมดประมาณ **{fmt_date(fc['exhaust_date'])}** "
+            f"(ช่วง 95%: {fmt_date(fc['exhaust_early'])} – {fmt_date(fc['exhaust_late'])}) "
+            f"| อัตราใช้จ่าย ฿{fc['rate']:,.0f} ± {fc['rate_se']:,.0f} ต่อวัน")
+st.plotly_chart(figures.forecast_figure(fc, total_budget), use_container_width=True)
 st.markdown('</div>', unsafe_allow_html=True)
 
+r4c1, r4c2 = st.columns(2)
+
+with r4c1:
+    st.subheader("อัตราใช้จ่ายรายหมวด (บาท/วัน)")
+    rates = fc['by_category'][['Category', 'Spent', 'Rate_per_day', 'Rate_SE']].copy()
+    rates.columns = ['หมวดหมู่', 'ใช้ไปแล้ว', 'บาท/วัน', '± (SE)']
+    st.dataframe(rates.round(0), use_container_width=True, hide_index=True)
+
+with r4c2:
+    st.subheader("รายจ่ายที่ผิดปกติในหมวด (Median/MAD)")
+    if unusual.empty:
+        st.success("ไม่พบรายจ่ายที่ผิดปกติ")
+    else:
+        table = unusual[['Item', 'Category', 'Expense', 'Median', 'Robust_Z']].copy()
+        table.columns = ['รายการ', 'หมวดหมู่', 'จำนวนเงิน', 'ค่ากลางของหมวด', 'Robust Z']
+        st.dataframe(table, use_container_width=True, hide_index=True)
+
 # --- LEDGER ---
 st.subheader("รายละเอียดรายการทั้งหมด")
-display_df = df_exp[['Item', 'Date_Group', 'Category', 'Expense']].copy()
-display_df.columns = ['รายการ', 'วันที่ (อ้างอิง)', 'หมวดหมู่', 'จำนวนเงิน']
+d1, d2, _ = st.columns([1, 1, 4])
+for col, fmt, label in [(d1, 'csv', "ดาวน์โหลด CSV"), (d2, 'xlsx', "ดาวน์โหลด Excel")]:
+    col.download_button(
+        label,
+        data=export.on_demand(['ledger', data_version], fmt, lambda: export.frame_chunks(agg['ledger_table']), sheet='Ledger'),
+        file_name=f"ledger.{fmt}",
+        mime=export.MIME[fmt],
+        on_click='ignore',
+    )
+display_df = agg['ledger_table'].copy()
 display_df['จำนวนเงิน'] = display_df['จำนวนเงิน'].apply(lambda x: f"{x:,.0f}")
 st.markdown(display_df.to_html(classes='styled-table', index=False), unsafe_allow_html=True)
\ No newline at end of file
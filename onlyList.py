@@ -1,6 +1,11 @@
 import streamlit as st
-import pandas as pd
-import re
+
+import aggregates
+import export
+import scoring
+import shared
+import snapshot
+import store
 
 # --- 1. PAGE CONFIGURATION ---
 st.set_page_config(
@@ -76,59 +81,88 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- 3. LOAD & PROCESS DATA ---
-@st.cache_data
-def load_data():
+CSV_PATH = 'file.csv'
+ALL = "ทั้งหมด"
+
+@st.cache_resource
+def load_frame(rules, source, version):
     try:
-        # Replace 'file.csv' with your actual file path
-        df = pd.read_csv('file.csv') 
+        if source == 'snapshot':
+            return snapshot.load_frame(version, 'patients')
+        # Scored once per host and shared between worker processes (see shared.py)
+        return shared.scored_patients(rules, CSV_PATH)
     except:
         return None
 
-    # Processing Logic
-    env_cols = df.columns[6:16] 
-    
-    # 1. Clean Village Name
-    def get_moo(address):
-        match = re.search(r'(?:หมู่|ม\.|Moo)\.?\s*(\d+)', str(address))
-        return f"หมู่ {match.group(1)}" if match else "ไม่ระบุ"
-    df['Village'] = df[df.columns[2]].apply(get_moo)
-
-    # 2. Extract Name Column Index
-    name_col = df.columns[1] 
-    
-    # 3. Calculate Risk Score
-    df['Env_Risk_Score'] = df.apply(lambda row: sum(1 for c in env_cols if "ใช่" in str(row[c]) and "ไม่ใช่" not in str(row[c])), axis=1)
-    
-    # 4. Calculate ADL Score
-    adl_cols = df.columns[16:26]
-    df['ADL_Score'] = df[adl_cols].applymap(lambda x: int(str(x).strip()[0]) if pd.notna(x) and str(x).strip()[0].isdigit() else 0).sum(axis=1)
-    
-    # 5. ADL Group
-    def categorize_adl(score):
-        if score >= 12: return "กลุ่มที่ 1: ช่วยเหลือตัวเองได้ (12-20)"
-        elif score >= 5: return "กลุ่มที่ 2: ดูแลตนเองได้บ้าง (5-11)"
-        else: return "กลุ่มที่ 3: ช่วยเหลือตัวเองไม่ได้ (0-4)"
-    df['ADL_Group'] = df['ADL_Score'].apply(categorize_adl)
-
-    return df, name_col
-
-data_load = load_data()
-
-if data_load is None:
+@st.cache_data
+def load_villages(rules, source, version):
+    if source == 'store':
+        conn = store.connect()
+        villages = store.villages(conn)
+        conn.close()
+        return villages
+    df = load_frame(rules, source, version)
+    return None if df is None else sorted(df['Village'].unique(), key=scoring.natural_key)
+
+# The store filters and sorts in SQL; the other paths filter the scored frame
+@st.cache_data
+def load_table(rules, source, version, village=None, adl_group=None, critical_only=False):
+    if source == 'store':
+        conn = store.connect()
+        table_df = store.patient_table(conn, rules, village, adl_group, critical_only=critical_only)
+        conn.close()
+        return table_df
+    df = load_frame(rules, source, version)
+    if df is None:
+        return None
+    return aggregates.patient_table(df, rules, village, adl_group, critical_only=critical_only)
+
+def table_chunks(rules, source, version, filters):
+    if source == 'store':
+        conn = store.connect()
+        try:
+            yield from store.patient_table_chunks(conn, rules, **filters)
+        finally:
+            conn.close()
+    else:
+        yield from export.frame_chunks(load_table(rules, source, version, **filters))
+
+rules = scoring.load_rules()
+source, version = shared.data_source(rules, CSV_PATH)
+villages = load_villages(rules, source, version)
+
+if villages is None:
     st.error("ไม่พบไฟล์ 'file.csv' กรุณาตรวจสอบว่าไฟล์อยู่ในโฟลเดอร์เดียวกัน")
     st.stop()
 
-df, name_col_index = data_load
-
-# --- 4. PREPARE TABLE DATA ---
-table_df = df[[name_col_index, 'Village', 'ADL_Score', 'Env_Risk_Score', 'ADL_Group']].copy()
-table_df.columns = ['ชื่อ-สกุล', 'หมู่บ้าน', 'คะแนน ADL (เต็ม 20)', 'คะแนนความเสี่ยงบ้าน (เต็ม 10)', 'กลุ่มอาการ']
-table_df = table_df.sort_values(by='คะแนน ADL (เต็ม 20)', ascending=True)
-
-# --- 5. RENDER PAGE ---
+# --- 4. RENDER PAGE ---
 
 st.header("รายชื่อผู้ป่วยและคะแนนประเมิน (Patient List)")
 
+f1, f2, f3 = st.columns(3)
+village = f1.selectbox("หมู่บ้าน", [ALL] + list(villages))
+adl_group = f2.selectbox("กลุ่มอาการ", [ALL] + scoring.adl_group_order(rules))
+critical_only = f3.checkbox("เฉพาะกลุ่มวิกฤต")
+filters = {
+    'village': None if village == ALL else village,
+    'adl_group': None if adl_group == ALL else adl_group,
+    'critical_only': critical_only,
+}
+table_df = load_table(rules, source, version, **filters)
+
+# Files are written in chunks on click and reused for the same filters (see export.py)
+export_key = ['patients', source, version, filters]
+file_stem = f"patients_{village}" + ("_critical" if critical_only else "")
+d1, d2, _ = st.columns([1, 1, 4])
+for col, fmt, label in [(d1, 'csv', "ดาวน์โหลด CSV"), (d2, 'xlsx', "ดาวน์โหลด Excel")]:
+    col.download_button(
+        label,
+        data=export.on_demand(export_key, fmt, lambda: table_chunks(rules, source, version, filters), sheet='Patients'),
+        file_name=f"{file_stem}.{fmt}",
+        mime=export.MIME[fmt],
+        on_click='ignore',
+    )
+
 # Convert DataFrame to HTML with the custom class
 html_table = table_df.to_html(classes="styled-table", index=False, escape=False)
 
@@ -0,0 +1,586 @@
+"""
+Mobile-unit visit planner: daily routes for N teams over the coming days.
+
+    python planner.py plan [--teams 2] [--days 5] [--all] [--out plan.csv]
+    python planner.py distances-template [--out village_distances.csv]
+
+Each patient gets a severity (ADL deficit, home risk, critical bonus; weights
+in rules.json "visit_plan"). A route is one team-day: it leaves the base
+(รพ.สต.), visits a sequence of villages and returns within `day_minutes`.
+Travel between villages comes from village_distances.csv (from,to,minutes,
+symmetric); pairs not listed take `default_travel_minutes`. Every visit costs
+`visit_minutes` plus `within_village_minutes` for walking between houses.
+
+Routes are filled day by day, team by team, so the sickest are seen first.
+Within a route the next visit is taken from a priority queue of villages
+keyed by severity per minute (top patient of the village / visit cost plus
+the cheapest insertion of the village into the route); entries go stale when
+the route changes and are re-keyed lazily when popped. Local search then
+2-opts each route's village order and re-inserts waiting patients, most
+severe first, into the earliest route where they fit or where dropping less
+severe visits makes room; the dropped ones wait again and get their turn.
+This repeats, with the freed time filled again, until nothing changes.
+
+Routes are keyed by calendar date. Re-planning starts from the previous
+plan: days that have passed are dropped, patients keep their slots, new ones
+go through the same severity-ordered re-insertion, and locked days (teams
+already out) are kept exactly. A patient bumped from their slot only moves
+within the days that changed anyway, so one new patient reshuffles one day,
+not every day after it. Only visits the teams confirmed (visits.csv, see
+confirm_visits) take a patient out of the plan; a past route alone does not.
+"""
+import argparse
+import heapq
+import itertools
+import os
+import threading
+from datetime import date, datetime, timedelta
+
+import comparison
+import lazy
+import scoring
+
+np = lazy.module('numpy')
+pd = lazy.module('pandas')
+
+DISTANCES_PATH = os.environ.get('STROKE_DISTANCES', 'village_distances.csv')
+VISITS_PATH = os.environ.get('STROKE_VISITS', 'visits.csv')
+VISIT_COLUMNS = ['Patient_Key', 'Name', 'Village', 'Date', 'Team', 'Recorded_At']
+PLAN_COLUMNS = ['วันที่', 'ทีม', 'ลำดับ', 'หมู่บ้าน', 'ชื่อ-สกุล', 'คะแนนความรุนแรง', 'คะแนน ADL',
+                'คะแนนความเสี่ยงบ้าน', 'เริ่มเยี่ยม (นาทีที่)']
+ROUTE_COLUMNS = ['วันที่', 'ทีม', 'เส้นทาง', 'จำนวนผู้ป่วย', 'คะแนนความรุนแรงรวม', 'เวลาเดินทาง (นาที)',
+                 'เวลารวม (นาที)']
+
+
+# --- INPUTS ---
+def candidates(df, rules, critical_only=True):
+    """One row per patient (latest submission) with its severity, most severe first."""
+    weights = rules['visit_plan']['severity']
+    name_col = scoring.name_column(df, rules)
+    df = comparison.latest_per_patient(df, rules)
+    if critical_only:
+        df = df[df['Is_Critical']]
+    adl_max = sum(rules['validation']['adl_item_max'])
+    severity = (weights['adl_deficit'] * (adl_max - df['ADL_Score']).clip(lower=0)
+                + weights['env_risk'] * df['Env_Risk_Score']
+                + weights['critical_bonus'] * df['Is_Critical'].astype(int))
+    cand = pd.DataFrame({
+        'Patient_Key': df['Patient_Key'].to_numpy(dtype=np.uint64),
+        'Name': df[name_col].to_numpy(),
+        'Village': df['Village'].to_numpy(),
+        'ADL_Score': df['ADL_Score'].to_numpy(),
+        'Env_Risk_Score': df['Env_Risk_Score'].to_numpy(),
+        'Severity': severity.to_numpy(dtype=float),
+    })
+    return cand.sort_values('Severity', ascending=False, kind='stable').reset_index(drop=True)
+
+
+def load_distances(path=DISTANCES_PATH):
+    """The village-distance table (from, to, minutes), or None if there is none yet."""
+    if not os.path.exists(path):
+        return None
+    table = pd.read_csv(path)
+    return table.dropna(subset=['minutes'])
+
+
+def travel_matrix(villages, distances, rules):
+    """
+    Travel minutes between the base (index 0) and `villages` (1..n). Pairs in
+    the table count both ways; anything else takes the default.
+    """
+    spec = rules['visit_plan']
+    names = [spec['base']] + sorted(set(villages) - {spec['base']})
+    n = len(names)
+    minutes = np.full((n, n), float(spec['default_travel_minutes']))
+    np.fill_diagonal(minutes, 0)
+    if distances is not None and len(distances):
+        index = pd.Index(names)
+        a = index.get_indexer(distances['from'].astype(str))
+        b = index.get_indexer(distances['to'].astype(str))
+        ok = (a >= 0) & (b >= 0) & (a != b)
+        m = distances['minutes'].to_numpy(dtype=float)[ok]
+        minutes[a[ok], b[ok]] = m
+        minutes[b[ok], a[ok]] = m
+    return {'villages': names, 'minutes': minutes}
+
+
+def distances_template(villages, rules, distances=None):
+    """Every village pair (with the base) for staff to fill in; known minutes are kept."""
+    travel = travel_matrix(villages, distances, rules)
+    names, minutes = travel['villages'], travel['minutes']
+    known = set()
+    if distances is not None:
+        known = {frozenset(p) for p in zip(distances['from'].astype(str), distances['to'].astype(str))}
+    pairs = list(itertools.combinations(range(len(names)), 2))
+    return pd.DataFrame({
+        'from': [names[i] for i, _ in pairs],
+        'to': [names[j] for _, j in pairs],
+        'minutes': [minutes[i, j] if frozenset((names[i], names[j])) in known else None for i, j in pairs],
+    })
+
+
+# --- CONFIRMED VISITS ---
+_visits_lock = threading.Lock()
+
+
+def load_visits(path=VISITS_PATH):
+    """Visits the teams confirmed, one row per patient (empty if none yet)."""
+    if not os.path.exists(path):
+        return pd.DataFrame({c: pd.Series(dtype=np.uint64 if c == 'Patient_Key' else object) for c in VISIT_COLUMNS})
+    visits = pd.read_csv(path, dtype={'Patient_Key': str, 'Date': str, 'Recorded_At': str})
+    visits['Patient_Key'] = visits['Patient_Key'].astype(np.uint64)
+    return visits
+
+
+def _save_visits(visits, path):
+    tmp = path + '.tmp'
+    visits.to_csv(tmp, index=False, encoding='utf-8')
+    os.replace(tmp, path)
+
+
+def confirm_visits(result, keys, path=VISITS_PATH):
+    """Records the planned visits of `keys` (from plan() `result`) as done, with their route's date and team."""
+    slot = {key: (r['date'], r['team']) for r in result['routes'] for _, ks in r['stops'] for key in ks}
+    info = result['patients'].set_index('Patient_Key')
+    keys = [key for key in keys if key in slot]
+    now = datetime.now().isoformat(timespec='seconds')
+    new = pd.DataFrame({
+        'Patient_Key': np.asarray(keys, dtype=np.uint64),
+        'Name': info.loc[keys, 'Name'].to_numpy() if keys else [],
+        'Village': info.loc[keys, 'Village'].to_numpy() if keys else [],
+        'Date': [slot[key][0].isoformat() for key in keys],
+        'Team': [slot[key][1] for key in keys],
+        'Recorded_At': [now] * len(keys),
+    })
+    with _visits_lock:
+        visits = load_visits(path)
+        visits = pd.concat([visits[~visits['Patient_Key'].isin(new['Patient_Key'])], new], ignore_index=True)
+        _save_visits(visits, path)
+    return len(keys)
+
+
+def undo_visits(keys, path=VISITS_PATH):
+    """Forgets the confirmed visits of `keys`: the patients are planned again."""
+    with _visits_lock:
+        visits = load_visits(path)
+        gone = visits['Patient_Key'].isin(np.asarray(list(keys), dtype=np.uint64))
+        _save_visits(visits[~gone], path)
+    return int(gone.sum())
+
+
+# --- ROUTES ---
+class _Route:
+    __slots__ = ('date', 'team', 'order', 'stops', 'travel', 'count')
+
+    def __init__(self, date, team):
+        self.date, self.team = date, team
+        self.order = []   # village indexes, base excluded
+        self.stops = {}   # village index -> [(severity, key)]
+        self.travel = 0.0
+        self.count = 0
+
+    def minutes(self, visit_cost):
+        return self.travel + visit_cost * self.count
+
+    def retour(self, d):
+        tour = [0] + self.order + [0]
+        self.travel = float(sum(d[a][b] for a, b in zip(tour, tour[1:])))
+
+    def insertion(self, v, d):
+        """(extra travel, position) of the cheapest place to put village v."""
+        if v in self.stops:
+            return 0.0, None
+        tour = [0] + self.order + [0]
+        return min((d[a][v] + d[v][b] - d[a][b], i) for i, (a, b) in enumerate(zip(tour, tour[1:])))
+
+    def add(self, v, patient, d, pos=None):
+        if v not in self.stops:
+            self.order.insert(self.insertion(v, d)[1] if pos is None else pos, v)
+            self.stops[v] = []
+            self.retour(d)
+        self.stops[v].append(patient)
+        self.count += 1
+
+    def remove(self, v, patient, d):
+        self.stops[v].remove(patient)
+        self.count -= 1
+        if not self.stops[v]:
+            del self.stops[v]
+            self.order.remove(v)
+            self.retour(d)
+
+    def two_opt(self, d):
+        """Reverses segments of the village order while that shortens the tour."""
+        tour = [0] + self.order + [0]
+        improved = True
+        while improved:
+            improved = False
+            for i in range(1, len(tour) - 2):
+                for j in range(i + 1, len(tour) - 1):
+                    a, b, c, e = tour[i - 1], tour[i], tour[j], tour[j + 1]
+                    if d[a][c] + d[b][e] < d[a][b] + d[c][e] - 1e-9:
+                        tour[i:j + 1] = tour[i:j + 1][::-1]
+                        improved = True
+        self.order = tour[1:-1]
+        self.retour(d)
+
+
+class _Queues:
+    """Waiting patients per village, each a max-heap on severity."""
+
+    def __init__(self):
+        self.heaps = {}
+        self._tie = itertools.count()
+
+    def push(self, v, patient):
+        heapq.heappush(self.heaps.setdefault(v, []), (-patient[0], next(self._tie), patient))
+
+    def top(self, v):
+        heap = self.heaps.get(v)
+        return heap[0] if heap else None
+
+    def pop(self, v):
+        return heapq.heappop(self.heaps[v])[2]
+
+    def villages(self):
+        return [v for v, heap in self.heaps.items() if heap]
+
+    def waiting(self):
+        return [entry[2] + (v,) for v, heap in self.heaps.items() for entry in heap]
+
+
+def _fill(route, queues, d, limit, visit_cost):
+    """Greedy: adds the best severity-per-minute visit that still fits, until none does."""
+    if route.minutes(visit_cost) + visit_cost > limit:
+        return  # full: not even a visit next door fits
+    version = 0
+    heap, parked = [], []
+
+    def push(v):
+        top = queues.top(v)
+        extra = visit_cost + route.insertion(v, d)[0]
+        heapq.heappush(heap, (top[0] / extra, top[1], v, version))
+
+    for v in queues.villages():
+        push(v)
+    while heap:
+        _, tie, v, seen = heapq.heappop(heap)
+        top = queues.top(v)
+        if top is None or top[1] != tie:
+            continue  # the village's top patient was taken since this entry was keyed
+        if seen != version:
+            push(v)
+            continue
+        extra, pos = route.insertion(v, d)
+        if route.minutes(visit_cost) + visit_cost + extra > limit:
+            parked.append(v)
+            continue
+        new_village = v not in route.stops
+        route.add(v, queues.pop(v), d, pos)
+        if new_village:
+            # Insertion costs changed for every village, parked ones may fit now
+            version += 1
+            for p in parked:
+                if queues.top(p) is not None:
+                    push(p)
+            parked = []
+        if queues.top(v) is not None:
+            push(v)
+
+
+def _eviction(route, assigned, v, severity, d, limit, visit_cost):
+    """
+    Least severe visits to drop from `route` (`assigned`, least severe first)
+    so a visit in village v fits, simulated without touching the route.
+    Returns (severity lost, evicted) or None if that would lose as much as it gains.
+    """
+    order, left = route.order, {}
+    travel, visits, lost, evicted = route.travel, route.count, 0.0, []
+    extra = route.insertion(v, d)[0]
+    assigned = iter(assigned)
+    while travel + visit_cost * (visits + 1) + extra > limit:
+        p, u = next(assigned, (None, None))
+        if p is None or lost + p[0] >= severity:
+            return None
+        lost += p[0]
+        evicted.append((p, u))
+        visits -= 1
+        left[u] = left.get(u, len(route.stops[u])) - 1
+        if not left[u]:
+            # Last visit in u: the tour skips the village
+            tour = [0] + order + [0]
+            i = order.index(u) + 1
+            travel -= d[tour[i - 1]][u] + d[u][tour[i + 1]] - d[tour[i - 1]][tour[i + 1]]
+            order = order[:i - 1] + order[i:]
+            if u == v or v not in route.stops:
+                tour = [0] + order + [0]
+                extra = min(d[a][v] + d[v][b] - d[a][b] for a, b in zip(tour, tour[1:]))
+    return lost, evicted
+
+
+def _reinsert(routes, queues, d, limit, visit_cost, settled=frozenset(), touched=None):
+    """
+    Local search: takes waiting patients most severe first and puts each into
+    the earliest route where it fits, dropping less severe visits from that
+    route when needed; the dropped patients wait again and get their own turn.
+    Every move gains severity. Returns True if anything changed.
+
+    With `touched` (dates), patients in `settled` (planned before) only go into
+    routes of those dates; a route that changes adds its date.
+    """
+    changed = False
+    assigned = {}
+    aside = []  # settled patients with no touched route yet: retried next round
+    heap = [(top[0], top[1], v) for v in queues.villages() for top in (queues.top(v),)]
+    heapq.heapify(heap)
+    done = set()  # villages whose top patient found no route: the less severe ones won't either
+    while heap:
+        _, tie, v = heapq.heappop(heap)
+        top = queues.top(v)
+        if v in done or top is None:
+            continue
+        if top[1] != tie:
+            heapq.heappush(heap, (top[0], top[1], v))
+            continue
+        severity = -top[0]
+        bound = touched is not None and top[2][1] in settled
+        for route in routes:
+            if bound and route.date not in touched:
+                continue
+            if route.minutes(visit_cost) + visit_cost <= limit:
+                extra, pos = route.insertion(v, d)
+                if route.minutes(visit_cost) + visit_cost + extra <= limit:
+                    route.add(v, queues.pop(v), d, pos)
+                    break
+            if route not in assigned:
+                assigned[route] = sorted((p, u) for u, ps in route.stops.items() for p in ps)
+            if not assigned[route] or assigned[route][0][0][0] >= severity:
+                continue
+            found = _eviction(route, assigned[route], v, severity, d, limit, visit_cost)
+            if found is not None:
+                for p, u in found[1]:
+                    route.remove(u, p, d)
+                    queues.push(u, p)
+                    if u != v and u not in done:
+                        top_u = queues.top(u)
+                        heapq.heappush(heap, (top_u[0], top_u[1], u))
+                route.add(v, queues.pop(v), d)
+                break
+        else:
+            if bound:
+                aside.append((v, queues.pop(v)))
+                top = queues.top(v)
+                if top is not None:
+                    heapq.heappush(heap, (top[0], top[1], v))
+            else:
+                done.add(v)
+            continue
+        assigned.pop(route, None)
+        if touched is not None:
+            touched.add(route.date)
+        changed = True
+        if queues.top(v) is not None:
+            top = queues.top(v)
+            heapq.heappush(heap, (top[0], top[1], v))
+    for v, patient in aside:
+        queues.push(v, patient)
+    return changed
+
+
+# --- PLAN ---
+def plan(cand, travel, teams, days, rules, previous=None, locked_days=0, start=None, visited=()):
+    """
+    Routes for `teams` x `days` calendar days from `start` (today) covering as
+    much severity as the time allows; patients in `visited` (confirmed visits,
+    see load_visits) are left out. With `previous` (an earlier result), its
+    assignments are kept for patients still in `cand`; its days before `start`
+    are dropped and their patients planned again. A kept patient bumped by a
+    new one only moves within the days that change. Routes in the first
+    `locked_days` days are copied from `previous` as they were, patients
+    missing from `cand` included.
+    """
+    spec = rules['visit_plan']
+    limit, visit_cost = float(spec['day_minutes']), float(spec['visit_minutes'] + spec['within_village_minutes'])
+    start = date.today() if start is None else start
+    names = travel['villages']
+    d = travel['minutes'].tolist()
+    index = {name: i for i, name in enumerate(names)}
+
+    by_slot, known = {}, cand.iloc[:0]
+    if previous is not None:
+        by_slot = {(r['date'], r['team']): r for r in previous['routes'] if r['date'] >= start}
+        known = previous['patients']
+    cand = cand[~cand['Patient_Key'].isin(np.asarray(list(visited), dtype=np.uint64))]
+    patients = dict(zip(cand['Patient_Key'].tolist(), zip(cand['Severity'].tolist(), cand['Patient_Key'].tolist())))
+
+    slots = [(start + timedelta(days=i), team) for i in range(days) for team in range(1, teams + 1)]
+    locked_until = start + timedelta(days=locked_days)
+    kept = {slot: by_slot[slot] for slot in slots if slot[0] < locked_until and slot in by_slot}
+    placed = {key for r in kept.values() for _, keys in r['stops'] for key in keys}
+    routes = [_Route(day, team) for day, team in slots if (day, team) not in kept]
+    # Dates whose routes may change; settled patients (kept from the last plan) stay within them
+    touched, settled = set(), set()
+    for route in routes:
+        old = by_slot.get((route.date, route.team))
+        if old is None:
+            touched.add(route.date)
+            continue
+        for village, keys in old['stops']:
+            for key in keys:
+                if key in patients and key not in placed and village in index:
+                    route.add(index[village], patients[key], d, len(route.order))  # village order as planned
+                    placed.add(key)
+                    settled.add(key)
+                else:
+                    touched.add(route.date)  # visited, gone from the export or moved village
+        # Shorter days or longer visits since the last plan: least severe visits wait again
+        for p, u in sorted((p, u) for u, ps in route.stops.items() for p in ps):
+            if route.minutes(visit_cost) <= limit:
+                break
+            route.remove(u, p, d)
+            placed.discard(p[1])
+            touched.add(route.date)
+
+    queues = _Queues()
+    for key, v in zip(cand['Patient_Key'].tolist(), cand['Village']):
+        if key not in placed:
+            queues.push(index[v], patients[key])
+
+    # Re-planning skips the fill: new patients would take the first free
+    # minutes (late days) instead of pushing less severe ones back
+    if previous is None:
+        for route in routes:
+            _fill(route, queues, d, limit, visit_cost)
+    # Each round gains severity, so this ends once no waiting patient can get in
+    bound = None if previous is None else touched
+    changed = True
+    while changed:
+        for route in routes:
+            if bound is None or route.date in bound:
+                route.two_opt(d)
+        changed = _reinsert(routes, queues, d, limit, visit_cost, settled, bound)
+        for route in routes:
+            if bound is None or route.date in bound:
+                _fill(route, queues, d, limit, visit_cost)
+
+    out = {slot: dict(r, day=(slot[0] - start).days + 1) for slot, r in kept.items()}
+    for route in routes:
+        arrivals, clock, here = [], 0.0, 0
+        for v in route.order:
+            clock += d[here][v]
+            arrivals.append(clock)
+            clock += visit_cost * len(route.stops[v])
+            here = v
+        out[(route.date, route.team)] = {
+            'date': route.date, 'day': (route.date - start).days + 1, 'team': route.team,
+            'stops': [(names[v], [key for _, key in sorted(route.stops[v], reverse=True)]) for v in route.order],
+            'arrivals': arrivals, 'travel': route.travel, 'minutes': route.minutes(visit_cost),
+        }
+    out = [out[slot] for slot in slots]
+
+    planned = [key for r in out for _, keys in r['stops'] for key in keys]
+    missing = known[known['Patient_Key'].isin(list(placed - set(patients)))]
+    in_plan = pd.concat([cand[cand['Patient_Key'].isin(planned)], missing], ignore_index=True)
+    waiting = queues.waiting()
+    return {
+        'routes': out,
+        'waiting': [key for _, key, _ in sorted(waiting, reverse=True)],
+        'covered': float(in_plan['Severity'].sum()),
+        'total': float(cand['Severity'].sum() + missing['Severity'].sum()),
+        'visit_cost': visit_cost,
+        'base': names[0],
+        'patients': in_plan,
+    }
+
+
+def schedule_table(result):
+    """One row per visit, in route order, with the minute the visit starts."""
+    info = result['patients'].set_index('Patient_Key')
+    visit_cost = result['visit_cost']
+    rows = []
+    for route in result['routes']:
+        for stop, ((village, keys), arrival) in enumerate(zip(route['stops'], route['arrivals']), start=1):
+            for i, key in enumerate(keys):
+                rows.append((route['date'], route['team'], stop, village, key, arrival + i * visit_cost))
+    table = pd.DataFrame(rows, columns=['date', 'team', 'stop', 'village', 'key', 'start'])
+    patients = info.loc[table['key'].to_numpy(dtype=np.uint64)] if len(table) else info.iloc[:0]
+    return pd.DataFrame({
+        PLAN_COLUMNS[0]: table['date'].to_numpy(),
+        PLAN_COLUMNS[1]: table['team'].to_numpy(),
+        PLAN_COLUMNS[2]: table['stop'].to_numpy(),
+        PLAN_COLUMNS[3]: table['village'].to_numpy(),
+        PLAN_COLUMNS[4]: patients['Name'].to_numpy(),
+        PLAN_COLUMNS[5]: patients['Severity'].to_numpy(),
+        PLAN_COLUMNS[6]: patients['ADL_Score'].to_numpy(),
+        PLAN_COLUMNS[7]: patients['Env_Risk_Score'].to_numpy(),
+        PLAN_COLUMNS[8]: table['start'].round().astype(int).to_numpy(),
+    })
+
+
+def route_table(result):
+    severity = dict(zip(result['patients']['Patient_Key'].tolist(), result['patients']['Severity'].tolist()))
+    base = result['base']
+    return pd.DataFrame([
+        (r['date'], r['team'], ' → '.join([base] + [v for v, _ in r['stops']] + [base]) if r['stops'] else '-',
+         sum(len(k) for _, k in r['stops']), sum(severity[k] for _, keys in r['stops'] for k in keys),
+         round(r['travel']), round(r['minutes']))
+        for r in result['routes']
+    ], columns=ROUTE_COLUMNS)
+
+
+class VisitPlanner:
+    """
+    Last plan per (teams, days, time limits, travel table), shared by every session, so a
+    new export is planned on top of the previous plan instead of from scratch.
+    """
+
+    def __init__(self):
+        self._plans = {}
+        self._lock = threading.Lock()
+
+    def update(self, cand, travel, teams, days, rules, locked_days=0, scope=None, start=None, visited=()):
+        """Plans `cand` on top of the last plan with the same settings (`scope`: e.g. the patient filter)."""
+        spec = rules['visit_plan']
+        key = (scope, teams, days, spec['day_minutes'], spec['visit_minutes'], spec['within_village_minutes'],
+               tuple(travel['villages']), travel['minutes'].tobytes())
+        with self._lock:
+            result = plan(cand, travel, teams, days, rules, self._plans.get(key), locked_days, start, visited)
+            self._plans[key] = result
+            return result
+
+
+# --- CLI ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mobile-unit visit planner")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_plan = sub.add_parser('plan', help="print or save the visit plan")
+    p_plan.add_argument('--csv', default='file.csv')
+    p_plan.add_argument('--distances', default=DISTANCES_PATH)
+    p_plan.add_argument('--visits', default=VISITS_PATH, help="confirmed visits to leave out")
+    p_plan.add_argument('--teams', type=int, default=2)
+    p_plan.add_argument('--days', type=int, default=5)
+    p_plan.add_argument('--all', action='store_true', help="plan every patient, not only the critical group")
+    p_plan.add_argument('--out', help="write the schedule to this CSV file")
+    p_tpl = sub.add_parser('distances-template', help="write every village pair for the distance table")
+    p_tpl.add_argument('--csv', default='file.csv')
+    p_tpl.add_argument('--out', default=DISTANCES_PATH)
+    args = parser.parse_args(argv)
+
+    rules = scoring.load_rules()
+    df = scoring.score(pd.read_csv(args.csv), rules)
+    if args.command == 'plan':
+        cand = candidates(df, rules, critical_only=not args.all)
+        travel = travel_matrix(cand['Village'], load_distances(args.distances), rules)
+        result = plan(cand, travel, args.teams, args.days, rules, visited=load_visits(args.visits)['Patient_Key'])
+        print(route_table(result).to_string(index=False))
+        print(f"covered {result['covered']:.0f} / {result['total']:.0f} severity, {len(result['waiting'])} waiting")
+        if args.out:
+            schedule_table(result).to_csv(args.out, index=False, encoding='utf-8-sig')
+    elif args.command == 'distances-template':
+        distances = load_distances(args.out)
+        distances_template(df['Village'].unique(), rules, distances).to_csv(args.out, index=False, encoding='utf-8-sig')
+        print(f"{args.out}: fill in the minutes column")
+
+
+if __name__ == '__main__':
+    main()
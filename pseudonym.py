@@ -0,0 +1,126 @@
+"""
+Keyed-hash pseudonyms for the public (อสม.) deployment.
+
+With STROKE_PUBLIC=1 the offline builders (`shared.py publish`, `snapshot.py
+build`, `store.py ingest`) pass the scored frame through anonymize() before it
+is published, pickled or written to SQLite; the Streamlit workers only read
+those artifacts and never open the export, so sessions only see pseudonyms.
+Each PII column is factorized and only its distinct values are hashed
+(HMAC-SHA256 with a secret key). The value -> pseudonym mapping is cached per key, indexed by a 64-bit
+SipHash of the value keyed from the same secret, so neither the cache nor
+Patient_Key can be rebuilt from a list of names without the key.
+
+The key comes from STROKE_PSEUDONYM_KEY, else pseudonym.key (created on first
+use). Keep it: the same key gives the same pseudonyms on every reload.
+"""
+import hashlib
+import hmac
+import os
+import secrets
+
+import lazy
+import scoring
+
+np = lazy.module('numpy')
+pd = lazy.module('pandas')
+
+PUBLIC = os.environ.get('STROKE_PUBLIC', '') == '1'
+KEY_PATH = os.environ.get('STROKE_PSEUDONYM_KEY_FILE', 'pseudonym.key')
+DIGITS = 10
+
+
+# --- KEY ---
+def load_key(path=KEY_PATH):
+    env = os.environ.get('STROKE_PSEUDONYM_KEY')
+    if env:
+        return env.encode('utf-8')
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        with open(path, 'rb') as f:
+            return f.read().strip()
+    key = secrets.token_hex(32).encode('ascii')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(key)
+    return key
+
+
+def key_id(key):
+    """Short fingerprint of the key, for cache keys and versions (not secret)."""
+    return hashlib.sha256(b'stroke-key-id|' + key).hexdigest()[:12]
+
+
+def _hash_key(key, label):
+    """16-character SipHash key for pd.util.hash_array, derived from the secret."""
+    return hmac.new(key, f'siphash|{label}'.encode('utf-8'), hashlib.sha256).hexdigest()[:16]
+
+
+# --- MAPPING CACHE ---
+_MAPPINGS = {}
+
+
+def _mapped(values, key, label, make):
+    """
+    Applies make(key, value) to every distinct value once and broadcasts the
+    result back through the factorized codes. Results are remembered per
+    (key, label) so later reloads only hash values not seen before.
+    """
+    codes, uniques = pd.factorize(values)
+    uniques = np.asarray(uniques, dtype=object)
+    fast = pd.util.hash_array(uniques, hash_key=_hash_key(key, label)) if len(uniques) \
+        else np.empty(0, dtype=np.uint64)
+
+    cache_key = (key_id(key), label)
+    cache = _MAPPINGS.get(cache_key)
+    if cache is None:
+        cache = pd.Series([], index=pd.Index([], dtype=np.uint64), dtype=object)
+    pos = cache.index.get_indexer(fast)
+    missing = pos < 0
+    if missing.any():
+        new = pd.Series([make(key, u) for u in uniques[missing]], index=fast[missing], dtype=object)
+        cache = pd.concat([cache, new[~new.index.duplicated()]])
+        pos = cache.index.get_indexer(fast)
+    _MAPPINGS[cache_key] = cache
+    return cache.to_numpy()[pos], codes
+
+
+def _text(label):
+    def make(key, value):
+        digest = hmac.new(key, f'{label}|{value}'.encode('utf-8'), hashlib.sha256).hexdigest()
+        return f'{label}-{digest[:DIGITS]}'
+    return make
+
+
+def pseudonyms(values, key, label):
+    """Keyed pseudonym for each value ('' where the value is missing)."""
+    mapped, codes = _mapped(values, key, label, _text(label))
+    out = mapped[codes] if len(mapped) else np.full(len(codes), '', dtype=object)
+    return np.where(codes >= 0, out, '')
+
+
+# --- PUBLIC FRAME ---
+def anonymize(df, rules, key=None):
+    """
+    Replaces the name / address / phone columns with pseudonyms and blanks the
+    free-text link columns, in place. Derived columns (Village, Sex, scores,
+    DQ_Flags) are computed beforehand and kept. Patient_Key is recomputed from
+    the names, and Row_Hash (see changes.py) from its decimal text, with a
+    SipHash keyed from the secret, so neither can be recomputed from a list of
+    names without the key.
+    """
+    spec = rules['pseudonymize']
+    key = load_key() if key is None else key
+    # Before the names are replaced: the key is computed from them
+    if 'Patient_Key' in df.columns:
+        df['Patient_Key'] = scoring.patient_keys(df, df['Village'], rules, _hash_key(key, 'Patient_Key'))
+    if 'Row_Hash' in df.columns:
+        # hash_array only applies hash_key to object arrays: hash the digest as text
+        digests = df['Row_Hash'].astype(str).to_numpy(dtype=object)
+        df['Row_Hash'] = pd.util.hash_array(digests, hash_key=_hash_key(key, 'Row_Hash'))
+    for field, label in spec['columns'].items():
+        col = df.columns[rules['columns'][field]]
+        df[col] = pseudonyms(df[col].astype(str).where(df[col].notna()), key, label)
+    for i in spec['blank']:
+        if i < len(df.columns):
+            df[df.columns[i]] = ''
+    return df
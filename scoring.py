@@ -0,0 +1,246 @@
+import hashlib
+import json
+import re
+from collections import OrderedDict
+
+import lazy
+
+np = lazy.module('numpy')
+pd = lazy.module('pandas')
+
+# --- RULES FILE ---
+RULES_PATH = 'rules.json'
+
+
+def load_rules(path=RULES_PATH):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _digest(obj):
+    payload = json.dumps(obj, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8')
+    return hashlib.sha1(payload).hexdigest()
+
+
+def rules_hash(rules):
+    return _digest(rules)
+
+
+def _resolve(rules, path):
+    node = rules
+    for part in path.split('.'):
+        node = node[part]
+    return node
+
+
+# --- COLUMN MAPPINGS ---
+def _column_range(df, spec):
+    return df.columns[spec[0]:spec[1]]
+
+
+def env_columns(df, rules):
+    return _column_range(df, rules['columns']['env'])
+
+
+def adl_columns(df, rules):
+    return _column_range(df, rules['columns']['adl'])
+
+
+def env_labels(df, rules):
+    return dict(zip(env_columns(df, rules), rules['env_labels']))
+
+
+def adl_labels(df, rules):
+    return dict(zip(adl_columns(df, rules), rules['adl_labels']))
+
+
+def name_column(df, rules):
+    return df.columns[rules['columns']['name']]
+
+
+def natural_key(text):
+    """Sort key that puts 'หมู่ 2' before 'หมู่ 10'."""
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', str(text))]
+
+
+def adl_group_order(rules):
+    """ADL group labels from most dependent to most independent (chart order)."""
+    return [g['label'] for g in sorted(rules['adl_groups'], key=lambda g: g['min'])]
+
+
+def env_hits(df, rules):
+    """Boolean frame: True where an env checklist answer is "ใช่" (and not "ไม่ใช่")."""
+    spec = rules['env_risk']
+    block = df[env_columns(df, rules)].astype(str)
+    return block.apply(lambda s: s.str.contains(spec['yes'], regex=False) & ~s.str.contains(spec['no'], regex=False))
+
+
+def _leading_digit(s):
+    # Answers come from a fixed list of choices, so parse each distinct text once
+    codes, uniques = pd.factorize(s)
+    first = pd.Series(uniques, dtype=object).astype(str).str.strip().str[:1]
+    parsed = pd.to_numeric(first.where(first.str.isdigit()), errors='coerce').to_numpy(dtype=float)
+    out = np.full(len(s), np.nan)
+    known = codes >= 0
+    out[known] = parsed[codes[known]]
+    return pd.Series(out, index=s.index)
+
+
+def adl_digits(df, rules):
+    """Leading digit of each ADL answer, NaN where the answer does not start with one."""
+    return df[adl_columns(df, rules)].apply(_leading_digit)
+
+
+def adl_item_columns(rules):
+    return [f'ADL_{i + 1}' for i in range(len(rules['adl_labels']))]
+
+
+def adl_matrix(df, rules):
+    """N x 10 uint8 matrix of ADL item scores, parsed only if the frame doesn't already carry it."""
+    cols = adl_item_columns(rules)
+    if all(c in df.columns for c in cols):
+        return np.column_stack([df[c].to_numpy() for c in cols]).astype(np.uint8, copy=False)
+    return adl_digits(df, rules).fillna(0).to_numpy(dtype=np.uint8)
+
+
+# --- DERIVED COLUMNS ---
+# Each entry: (output column, rule sections it reads, derived columns it reads, builder).
+# The builders work on whole columns, so one call scores the entire frame. A
+# builder may return a frame (ADL_Items): its columns are attached instead.
+def _village(df, out, rules):
+    spec = rules['village']
+    address = df.iloc[:, rules['columns']['address']].astype(str)
+    moo = address.str.extract(spec['pattern'], expand=False)
+    return (spec['prefix'] + moo).fillna(spec['missing'])
+
+
+def _sex(df, out, rules):
+    spec = rules['sex']
+    names = df.iloc[:, rules['columns']['name']].astype(str).str.strip()
+    conditions = [names.str.startswith(prefix) for prefix, _ in spec['prefixes']]
+    choices = [label for _, label in spec['prefixes']]
+    return pd.Series(np.select(conditions, choices, default=spec['missing']), index=df.index)
+
+
+def _env_risk(df, out, rules):
+    return env_hits(df, rules).sum(axis=1).astype(int)
+
+
+def _adl_items(df, out, rules):
+    # The one parse of the ADL answers: item scores as uint8 ADL_1..ADL_10 (0 when
+    # missing) plus ADL_Unparsed, which validation turns into its flag
+    digits = adl_digits(df, rules)
+    items = pd.DataFrame(digits.fillna(0).to_numpy(dtype=np.uint8), columns=adl_item_columns(rules), index=df.index)
+    items['ADL_Unparsed'] = digits.isna().to_numpy().any(axis=1)
+    return items
+
+
+def _adl_score(df, out, rules):
+    return out[adl_item_columns(rules)].sum(axis=1).astype(int)
+
+
+def _adl_group(df, out, rules):
+    groups = sorted(rules['adl_groups'], key=lambda g: g['min'], reverse=True)
+    score = out['ADL_Score']
+    conditions = [score >= g['min'] for g in groups[:-1]]
+    choices = [g['label'] for g in groups[:-1]]
+    return pd.Series(np.select(conditions, choices, default=groups[-1]['label']), index=df.index)
+
+
+def _mobility(df, out, rules):
+    spec = rules['mobility']
+    first = df.iloc[:, rules['columns']['mobility']].astype(str).str[0]
+    return first.map(spec['map']).fillna(spec['missing'])
+
+
+def patient_keys(df, villages, rules, hash_key=None):
+    """
+    Same person across exports: hash of name without spaces + house number + หมู่.
+    `hash_key` (16 characters) keys the hash; the public deployment derives it
+    from the pseudonym secret (see pseudonym.anonymize).
+    """
+    names = df.iloc[:, rules['columns']['name']].astype(str).str.replace(r'\s+', '', regex=True)
+    house = df.iloc[:, rules['columns']['address']].astype(str) \
+        .str.extract(rules['patient_key']['house_pattern'], expand=False).fillna('')
+    key = (names + '|' + house + '|' + villages).to_numpy(dtype=object)
+    hashed = pd.util.hash_array(key) if hash_key is None else pd.util.hash_array(key, hash_key=hash_key)
+    return pd.Series(hashed, index=df.index)
+
+
+def _patient_key(df, out, rules):
+    return patient_keys(df, out['Village'], rules)
+
+
+def _critical(df, out, rules):
+    spec = rules['critical']
+    return (out['ADL_Score'] < spec['adl_below']) & (out['Env_Risk_Score'] >= spec['risk_at_least'])
+
+
+def _risky_home(df, out, rules):
+    return out['Env_Risk_Score'] >= rules['risky_home']['risk_at_least']
+
+
+DERIVED = [
+    ('Village', ['columns.address', 'village'], [], _village),
+    ('Sex', ['columns.name', 'sex'], [], _sex),
+    ('Env_Risk_Score', ['columns.env', 'env_risk'], [], _env_risk),
+    ('ADL_Items', ['columns.adl', 'adl_labels'], [], _adl_items),
+    ('ADL_Score', [], ['ADL_Items'], _adl_score),
+    ('ADL_Group', ['adl_groups'], ['ADL_Score'], _adl_group),
+    ('Mobility_Label', ['columns.mobility', 'mobility'], [], _mobility),
+    ('Patient_Key', ['columns.name', 'columns.address', 'patient_key'], ['Village'], _patient_key),
+    ('Is_Critical', ['critical'], ['ADL_Score', 'Env_Risk_Score'], _critical),
+    ('Is_Risky_Home', ['risky_home'], ['Env_Risk_Score'], _risky_home),
+]
+
+
+# --- COMPILE ONCE PER RULE SET ---
+_COMPILED = {}
+
+
+def compile_rules(rules):
+    """
+    Binds every derived column to a key made from only the rule sections it
+    (and its upstream columns) read. Editing one threshold changes the keys of
+    the columns that depend on it and nothing else.
+    """
+    rh = rules_hash(rules)
+    if rh not in _COMPILED:
+        keys = {}
+        plan = []
+        for name, sections, inputs, build in DERIVED:
+            keys[name] = _digest([name, [_resolve(rules, s) for s in sections], [keys[i] for i in inputs]])
+            plan.append((name, keys[name], build))
+        _COMPILED[rh] = plan
+    return _COMPILED[rh]
+
+
+# --- VERSIONED RESULT CACHE ---
+_CACHE_SIZE = 256
+_results = OrderedDict()
+
+
+def data_hash(df):
+    return hashlib.sha1(pd.util.hash_pandas_object(df, index=True).values.tobytes()).hexdigest()
+
+
+def score(df, rules):
+    """Returns a copy of the raw survey frame with every derived column attached."""
+    plan = compile_rules(rules)
+    dh = data_hash(df)
+    out = df.copy()
+    for name, key, build in plan:
+        cache_key = (dh, key)
+        if cache_key in _results:
+            _results.move_to_end(cache_key)
+        else:
+            _results[cache_key] = build(df, out, rules)
+            if len(_results) > _CACHE_SIZE:
+                _results.popitem(last=False)
+        result = _results[cache_key]
+        if isinstance(result, pd.DataFrame):
+            for col in result.columns:
+                out[col] = result[col]
+        else:
+            out[name] = result
+    return out
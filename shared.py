@@ -0,0 +1,312 @@
+"""
+Host-wide shared-memory copies of the processed frames.
+
+With several Streamlit server processes on one host, each would otherwise
+parse, score and hold its own copy of the patient / ledger frames. Here the
+first process to need a frame builds it and publishes it into a POSIX
+shared-memory block as flat NumPy buffers; every other process attaches to
+that block and wraps the buffers without copying. Text columns are stored as
+integer codes plus a (small) list of distinct values and decoded back to
+their original dtype when attached, so value_counts() / groupby behave as on
+the source frame (no Categorical zero-count groups or category ordering).
+
+Blocks are named after the input file's absolute path and a version derived
+from its size/mtime and the rules hash, so a new export is published under a
+new name and older versions of the same file are unlinked, while another
+deployment (or loadtest.py) on the same host keeps its own blocks.
+`python shared.py drop` removes everything.
+"""
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import lazy
+import ledger
+import pseudonym
+import scoring
+import snapshot
+import store
+import validation
+
+np = lazy.module('numpy')
+pd = lazy.module('pandas')
+
+PREFIX = 'stroke_'
+_ALIGN = 64
+_LEN = struct.Struct('<Q')
+_SHM_DIR = '/dev/shm'
+
+
+# --- BLOCK HANDLING ---
+def _open(name, create=False, size=0):
+    # The block must outlive whichever worker created it, so keep it away from
+    # the multiprocessing resource tracker (which unlinks on process exit).
+    try:
+        return shared_memory.SharedMemory(name=name, create=create, size=size, track=False)
+    except TypeError:  # Python < 3.13 has no `track`
+        shm = shared_memory.SharedMemory(name=name, create=create, size=size)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+def _block_name(name, version):
+    return f'{PREFIX}{name}_{version}'
+
+
+def _source_name(name, path):
+    """Frame name qualified by the file it is built from (one set of blocks per deployment)."""
+    return f'{name}_{scoring._digest([os.path.realpath(path)])[:8]}'
+
+
+def file_version(path, rules=None):
+    st = os.stat(path)
+    parts = [str(st.st_size), str(st.st_mtime_ns), scoring.rules_hash(rules) if rules is not None else '']
+    return scoring._digest(parts)[:16]
+
+
+def _code_dtype(n_categories):
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def _encode(df):
+    """Splits a frame into (column specs, numpy buffers)."""
+    specs, buffers = [], []
+    for col in df.columns:
+        s = df[col]
+        spec = {'name': col}
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            spec['categorical'] = True
+            values, categories = s.cat.codes.to_numpy(), list(s.cat.categories)
+        elif pd.api.types.is_datetime64_any_dtype(s.dtype):
+            spec['datetime'] = str(s.dtype)
+            values, categories = s.to_numpy().view('i8'), None
+        elif pd.api.types.is_bool_dtype(s.dtype) or pd.api.types.is_numeric_dtype(s.dtype):
+            values, categories = s.to_numpy(), None
+        else:
+            spec['text'] = str(s.dtype)
+            codes, uniques = pd.factorize(s)
+            values, categories = codes.astype(np.int32), list(uniques)
+        if categories is not None:
+            # Same code width pandas picks, so Categorical.from_codes wraps instead of casting
+            values = values.astype(_code_dtype(len(categories)))
+            spec['categories'] = [None if pd.isna(c) else c for c in categories]
+        spec['dtype'] = values.dtype.str
+        specs.append(spec)
+        buffers.append(np.ascontiguousarray(values))
+    return specs, buffers
+
+
+def _json_default(o):
+    return o.item() if hasattr(o, 'item') else str(o)
+
+
+def publish(name, version, df):
+    """Writes `df` into a new shared-memory block. Returns the attached (read-only) frame."""
+    specs, buffers = _encode(df)
+    offset = 0
+    for spec, buf in zip(specs, buffers):
+        spec['offset'], spec['length'] = offset, len(buf)
+        offset += -(-buf.nbytes // _ALIGN) * _ALIGN
+    header = json.dumps({'columns': specs, 'attrs': df.attrs, 'rows': len(df)},
+                        ensure_ascii=False, default=_json_default).encode('utf-8')
+    data_start = -(-(_LEN.size + len(header)) // _ALIGN) * _ALIGN
+
+    shm = _open(_block_name(name, version), create=True, size=max(data_start + offset, 1))
+    for spec, buf in zip(specs, buffers):
+        start = data_start + spec['offset']
+        shm.buf[start:start + buf.nbytes] = buf.view(np.uint8).reshape(-1)
+    shm.buf[_LEN.size:_LEN.size + len(header)] = header
+    # Length goes in last: a non-zero length tells readers the block is complete
+    shm.buf[:_LEN.size] = _LEN.pack(len(header))
+    _drop_stale(name, version)
+    return _wrap(shm)
+
+
+def _wrap(shm):
+    (header_len,) = _LEN.unpack(bytes(shm.buf[:_LEN.size]))
+    meta = json.loads(bytes(shm.buf[_LEN.size:_LEN.size + header_len]).decode('utf-8'))
+    data_start = -(-(_LEN.size + header_len) // _ALIGN) * _ALIGN
+    columns = {}
+    for spec in meta['columns']:
+        arr = np.ndarray((spec['length'],), dtype=np.dtype(spec['dtype']), buffer=shm.buf,
+                         offset=data_start + spec['offset'])
+        arr.flags.writeable = False
+        if 'categories' in spec:
+            values = pd.Categorical.from_codes(arr, categories=pd.Index(spec['categories'], dtype=object))
+            columns[spec['name']] = values if spec.get('categorical') else values.astype(spec.get('text', object))
+        elif 'datetime' in spec:
+            columns[spec['name']] = arr.view(spec['datetime'])
+        else:
+            columns[spec['name']] = arr
+    df = pd.DataFrame(columns, copy=False)
+    df.attrs.update(meta['attrs'])
+    # Keep the mapping open for the life of the process
+    _ATTACHED[shm.name] = shm
+    return df
+
+
+_ATTACHED = {}
+
+
+def attach(name, version, wait=10.0):
+    """Attaches to a published block, or returns None if there isn't one."""
+    block = _block_name(name, version)
+    if block in _ATTACHED:
+        return _wrap(_ATTACHED[block])
+    try:
+        shm = _open(block)
+    except FileNotFoundError:
+        return None
+    deadline = time.monotonic() + wait
+    while _LEN.unpack(bytes(shm.buf[:_LEN.size]))[0] == 0:
+        if time.monotonic() > deadline:
+            # The publisher died before writing the length: drop the half-written block so it is rebuilt
+            shm.close()
+            unlink(block)
+            return None
+        time.sleep(0.05)
+    return _wrap(shm)
+
+
+def attach_or_publish(name, version, build):
+    df = attach(name, version)
+    if df is not None:
+        return df
+    built = build()
+    try:
+        return publish(name, version, built)
+    except FileExistsError:
+        # Another process published the same version first
+        df = attach(name, version)
+        return built if df is None else df
+    except OSError:
+        # No usable shared memory (e.g. /dev/shm full): fall back to a private copy
+        return built
+
+
+def _listed(name=None):
+    if not os.path.isdir(_SHM_DIR):
+        return []
+    prefix = PREFIX + (f'{name}_' if name else '')
+    return [f for f in os.listdir(_SHM_DIR) if f.startswith(prefix)]
+
+
+def _drop_stale(name, keep_version):
+    # Processes still attached keep their mapping; only the name goes away
+    for block in _listed(name):
+        if block != _block_name(name, keep_version):
+            unlink(block)
+
+
+def release(csv_path='file.csv', xlsx_path=ledger.LEDGER_PATH):
+    """Unlinks every block built from these files (e.g. a load test's scratch inputs)."""
+    for name, path in (('patients', csv_path), ('public_patients', csv_path), ('ledger', xlsx_path)):
+        for block in _listed(_source_name(name, path)):
+            unlink(block)
+
+
+def unlink(block):
+    # Plain (tracked) open so the tracker's register/unregister stay balanced
+    try:
+        shm = shared_memory.SharedMemory(name=block)
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
+
+
+# --- PROCESSED FRAMES ---
+def data_source(rules, csv_path='file.csv'):
+    """
+    Where the pages read patients from, as (source, version): a current
+    snapshot (`python snapshot.py build`), else the SQLite store, else the raw
+    export ('raw', None when there is no export).
+    """
+    snapshot_version = snapshot.latest(rules=rules, csv_path=csv_path)
+    if snapshot_version is not None:
+        return 'snapshot', snapshot_version
+    if store.available(rules=rules):
+        return 'store', store.version()
+    return 'raw', patients_version(rules, csv_path) if os.path.exists(csv_path) else None
+
+
+def patients_version(rules, csv_path='file.csv'):
+    version = file_version(csv_path, rules)
+    if pseudonym.PUBLIC:
+        version = scoring._digest([version, pseudonym.key_id(pseudonym.load_key())])[:16]
+    return version
+
+
+def _score_export(rules, csv_path, public):
+    df = scoring.score(pd.read_csv(csv_path), rules)
+    df['DQ_Flags'] = validation.validate(df, rules)
+    return pseudonym.anonymize(df, rules) if public else df
+
+
+def scored_patients(rules, csv_path='file.csv'):
+    """
+    Scored + validated survey frame, built once per host and attached read-only.
+    A public deployment never reads the export here: it only attaches the
+    pseudonymized frame that `python shared.py publish` (run outside Streamlit)
+    put in shared memory, and raises FileNotFoundError until that has run.
+    """
+    version = patients_version(rules, csv_path)
+    if pseudonym.PUBLIC:
+        df = attach(_source_name('public_patients', csv_path), version)
+        if df is None:
+            raise FileNotFoundError("public deployment: run `python shared.py publish` first")
+        return df
+    return attach_or_publish(_source_name('patients', csv_path), version,
+                             lambda: _score_export(rules, csv_path, False))
+
+
+def publish_patients(rules, csv_path='file.csv'):
+    """Builds and publishes the frame scored_patients() attaches (the only reader of the export)."""
+    name = 'public_patients' if pseudonym.PUBLIC else 'patients'
+    return attach_or_publish(_source_name(name, csv_path), patients_version(rules, csv_path),
+                             lambda: _score_export(rules, csv_path, pseudonym.PUBLIC))
+
+
+def expense_ledger(xlsx_path=ledger.LEDGER_PATH):
+    """(budget, expense rows) from the finance workbook, shared the same way."""
+    def build():
+        budget, df_exp = ledger.load_ledger(xlsx_path)
+        df_exp = df_exp.reset_index(drop=True)
+        df_exp.attrs['budget'] = budget
+        return df_exp
+    df_exp = attach_or_publish(_source_name('ledger', xlsx_path), file_version(xlsx_path), build)
+    return df_exp.attrs['budget'], df_exp
+
+
+# --- CLI ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Shared-memory frames for the Stroke Care dashboards")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_pub = sub.add_parser('publish', help="build and publish the patient and ledger frames")
+    p_pub.add_argument('--csv', default='file.csv')
+    p_pub.add_argument('--xlsx', default=ledger.LEDGER_PATH)
+    sub.add_parser('list', help="show published blocks")
+    sub.add_parser('drop', help="unlink every published block")
+    args = parser.parse_args(argv)
+
+    if args.command == 'publish':
+        patients = publish_patients(scoring.load_rules(), args.csv)
+        _, df_exp = expense_ledger(args.xlsx)
+        print(f"patients: {len(patients)} rows, ledger: {len(df_exp)} rows")
+    elif args.command == 'list':
+        for block in _listed():
+            print(block, os.path.getsize(os.path.join(_SHM_DIR, block)))
+    elif args.command == 'drop':
+        for block in _listed():
+            unlink(block)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
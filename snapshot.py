@@ -0,0 +1,223 @@
+"""
+Offline precompute for the dashboards.
+
+    python snapshot.py build [--out snapshots] [--csv file.csv] [--xlsx payment.xlsx] [--force]
+
+runs the whole pipeline (parse, score, validate, aggregate, build figures)
+outside Streamlit and writes a versioned snapshot directory. The version is a
+hash of the input files and rules.json, so running `build` from cron every few
+minutes is cheap: nothing is rebuilt until a new export arrives. The
+dashboards load the latest snapshot instead of processing the raw files.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+
+import plotly.io as pio
+
+import aggregates
+import changes
+import figures
+import lazy
+import ledger
+import pseudonym
+import scoring
+import validation
+
+pd = lazy.module('pandas')
+
+SNAPSHOT_DIR = os.environ.get('STROKE_SNAPSHOTS', 'snapshots')
+LATEST = 'LATEST'
+FORMAT = 2  # bump when the pickled aggregates / figures change shape
+
+
+def input_version(csv_path, xlsx_path, rules, public=False):
+    h = hashlib.sha1(scoring.rules_hash(rules).encode('utf-8'))
+    h.update(f'format {FORMAT}'.encode('ascii'))
+    if public:
+        h.update(pseudonym.key_id(pseudonym.load_key()).encode('ascii'))
+    for path in (csv_path, xlsx_path):
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+    return h.hexdigest()[:16]
+
+
+def _input_stats(csv_path, xlsx_path):
+    """Size and mtime of each input, to notice a newer export without re-hashing it."""
+    stats = {}
+    for name, path in (('csv', csv_path), ('xlsx', xlsx_path)):
+        st = os.stat(path)
+        stats[name] = [st.st_size, st.st_mtime_ns]
+    return stats
+
+
+def _write_manifest(snapshot_dir, manifest):
+    tmp = os.path.join(snapshot_dir, 'manifest.json.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, os.path.join(snapshot_dir, 'manifest.json'))
+
+
+def _write_figures(path, figs):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({name: fig.to_json() for name, fig in figs.items()}, f, ensure_ascii=False)
+
+
+def _point_latest(out_dir, version):
+    # Write-then-rename so readers never see a half-written pointer
+    tmp = os.path.join(out_dir, LATEST + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(version)
+    os.replace(tmp, os.path.join(out_dir, LATEST))
+
+
+def build(out_dir=SNAPSHOT_DIR, csv_path='file.csv', xlsx_path=ledger.LEDGER_PATH, rules=None, force=False,
+          public=None):
+    """
+    Builds a snapshot unless one already exists for these inputs. Returns (version, built).
+    A public snapshot holds pseudonyms only (see pseudonym.py).
+    """
+    rules = scoring.load_rules() if rules is None else rules
+    public = pseudonym.PUBLIC if public is None else public
+    version = input_version(csv_path, xlsx_path, rules, public)
+    target = os.path.join(out_dir, version)
+    if os.path.isdir(target) and not force:
+        # Same content (e.g. a re-copied export): record the new mtimes so latest() accepts it
+        manifest = _manifest(out_dir, version)
+        manifest['input_stats'] = _input_stats(csv_path, xlsx_path)
+        _write_manifest(target, manifest)
+        _point_latest(out_dir, version)
+        return version, False
+
+    raw = pd.read_csv(csv_path)
+    df = scoring.score(raw, rules)
+    df['DQ_Flags'] = validation.validate(df, rules)
+    if public:
+        pseudonym.anonymize(df, rules)
+    patient_agg = aggregates.patient_aggregates(df, rules)
+    budget, df_exp = ledger.load_ledger(xlsx_path)
+    ledger_agg = aggregates.ledger_aggregates(budget, df_exp)
+
+    os.makedirs(out_dir, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix='.build-', dir=out_dir)
+    df.to_pickle(os.path.join(tmp, 'patients.pkl'))
+    df_exp.to_pickle(os.path.join(tmp, 'ledger.pkl'))
+    pd.to_pickle(patient_agg, os.path.join(tmp, 'patient_aggregates.pkl'))
+    pd.to_pickle(ledger_agg, os.path.join(tmp, 'ledger_aggregates.pkl'))
+    _write_figures(os.path.join(tmp, 'patient_figures.json'), figures.patient_figures(patient_agg, rules))
+    _write_figures(os.path.join(tmp, 'ledger_figures.json'), figures.ledger_figures(ledger_agg))
+    _write_manifest(tmp, {
+        'version': version,
+        'built_at': datetime.now().isoformat(timespec='seconds'),
+        'rules_hash': scoring.rules_hash(rules),
+        'inputs': {'csv': csv_path, 'xlsx': xlsx_path},
+        'input_stats': _input_stats(csv_path, xlsx_path),
+        'patients': len(df),
+        'ledger_rows': len(df_exp),
+        'public': public,
+        'format': FORMAT,
+    })
+
+    if os.path.isdir(target):
+        shutil.rmtree(target)
+    os.replace(tmp, target)
+    _point_latest(out_dir, version)
+    # New export: append what changed since the previous one to the change feed
+    changes.record(raw, rules, public=public)
+    return version, True
+
+
+# --- READERS (used by the Streamlit apps) ---
+def latest(out_dir=SNAPSHOT_DIR, rules=None, csv_path='file.csv', xlsx_path=ledger.LEDGER_PATH):
+    """
+    Version of the newest snapshot, or None when nothing has been built or it
+    is stale (rules.json or the snapshot format changed, or the exports are
+    newer than the snapshot).
+    """
+    version = _pointer(out_dir)
+    if version is None or not os.path.isdir(os.path.join(out_dir, version)):
+        return None
+    manifest = _manifest(out_dir, version)
+    if pseudonym.PUBLIC and not manifest.get('public'):
+        return None  # never serve a snapshot with real names from the public deployment
+    if manifest.get('format') != FORMAT:
+        return None  # built by an older version of this module
+    rules = scoring.load_rules() if rules is None else rules
+    if manifest.get('rules_hash') != scoring.rules_hash(rules):
+        return None
+    if os.path.exists(csv_path) and os.path.exists(xlsx_path):
+        stats = manifest.get('input_stats')
+        if stats is not None:
+            if stats != _input_stats(csv_path, xlsx_path):
+                return None
+        elif input_version(csv_path, xlsx_path, rules, manifest.get('public', False)) != version:
+            return None  # snapshot from before input_stats was recorded
+    return version
+
+
+def _pointer(out_dir):
+    try:
+        with open(os.path.join(out_dir, LATEST), encoding='utf-8') as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def _manifest(out_dir, version):
+    with open(os.path.join(out_dir, version, 'manifest.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_aggregates(version, kind, out_dir=SNAPSHOT_DIR):
+    """kind is 'patient' or 'ledger'."""
+    return pd.read_pickle(os.path.join(out_dir, version, f'{kind}_aggregates.pkl'))
+
+
+def load_frame(version, kind, out_dir=SNAPSHOT_DIR):
+    """kind is 'patients' (scored survey rows) or 'ledger' (expense rows)."""
+    return pd.read_pickle(os.path.join(out_dir, version, f'{kind}.pkl'))
+
+
+def load_figures(version, kind, out_dir=SNAPSHOT_DIR):
+    with open(os.path.join(out_dir, version, f'{kind}_figures.json'), encoding='utf-8') as f:
+        return {name: pio.from_json(payload) for name, payload in json.load(f).items()}
+
+
+def prune(out_dir=SNAPSHOT_DIR, keep=5):
+    """Deletes all but the newest `keep` snapshots (never the one LATEST points to)."""
+    current = _pointer(out_dir)
+    versions = [d for d in os.listdir(out_dir)
+                if os.path.isdir(os.path.join(out_dir, d)) and not d.startswith('.')]
+    versions.sort(key=lambda d: os.path.getmtime(os.path.join(out_dir, d)), reverse=True)
+    for version in versions[keep:]:
+        if version != current:
+            shutil.rmtree(os.path.join(out_dir, version))
+
+
+# --- CLI ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stroke Care dashboard snapshots")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_build = sub.add_parser('build', help="run the pipeline and write a snapshot")
+    p_build.add_argument('--out', default=SNAPSHOT_DIR)
+    p_build.add_argument('--csv', default='file.csv')
+    p_build.add_argument('--xlsx', default=ledger.LEDGER_PATH)
+    p_build.add_argument('--force', action='store_true', help="rebuild even if the inputs are unchanged")
+    p_build.add_argument('--keep', type=int, default=5, help="number of old snapshots to keep")
+    p_build.add_argument('--public', action='store_true', default=pseudonym.PUBLIC,
+                         help="pseudonymize names, addresses and phones (default: STROKE_PUBLIC)")
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        version, built = build(args.out, args.csv, args.xlsx, force=args.force, public=args.public)
+        prune(args.out, args.keep)
+        print(f"{args.out}/{version}: {'built' if built else 'unchanged'}")
+
+
+if __name__ == '__main__':
+    main()
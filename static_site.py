@@ -0,0 +1,245 @@
+"""
+Static build of the dashboards for phones on slow mobile data.
+
+    python static_site.py build [--out site] [--force]
+
+renders the patient dashboard (index.html) and the finance report
+(finance.html) from the latest snapshot into a folder any static file server
+can host; no Streamlit session is involved. The bundle holds:
+
+    plotly-<version>.min.js     shared Plotly runtime, fetched once per device
+    data/<bundle>/template.json the Plotly theme, shared by every chart
+    data/<bundle>/<chart>.json  one figure each, aggregated data only
+    index.html, finance.html    KPI cards and text, charts filled in on scroll
+
+Every file also gets a pre-compressed .gz sibling (nginx `gzip_static on;`).
+Files under data/ and the runtime are named by version, so they can be cached
+forever; only the two HTML pages need revalidating. The bundle is rebuilt
+only when the snapshot (i.e. the input data or rules) changes.
+"""
+import argparse
+import gzip
+import html
+import json
+import os
+import shutil
+import tempfile
+
+import plotly.offline
+
+import figures
+import forecast
+import scoring
+import snapshot
+
+SITE_DIR = os.environ.get('STROKE_SITE', 'site')
+BUNDLE_FORMAT = 1
+KEEP_BUNDLES = 2
+
+
+# --- FILES ---
+def _write(path, data):
+    """Writes `data` and a gzip sibling, each through a temp file + rename."""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    for target, payload in ((path, data), (path + '.gz', gzip.compress(data, 9, mtime=0))):
+        tmp = target + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp, target)
+
+
+def _figure_json(fig):
+    # The theme is the bulk of a figure's JSON and identical for all of them: ship it once
+    payload = json.loads(fig.to_json())
+    payload['layout'].pop('template', None)
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':'))
+
+
+def _template_json(fig):
+    return json.dumps(json.loads(fig.to_json())['layout'].get('template', {}), separators=(',', ':'))
+
+
+def _runtime(out_dir):
+    name = f'plotly-{plotly.offline.get_plotlyjs_version()}.min.js'
+    if not os.path.exists(os.path.join(out_dir, name)):
+        _write(os.path.join(out_dir, name), plotly.offline.get_plotlyjs())
+    return name
+
+
+# --- PAGES ---
+_STYLE = """
+body { font-family: 'Sarabun', 'Segoe UI', Tahoma, sans-serif; margin: 0; padding: 12px; color: #1e293b; background: #f8fafc; }
+h1 { font-size: 1.4rem; } h2 { font-size: 1.15rem; margin-top: 28px; }
+.kpis { display: grid; grid-template-columns: repeat(auto-fit, minmax(150px, 1fr)); gap: 10px; }
+.kpi { background: #fff; border-radius: 10px; padding: 12px; box-shadow: 0 1px 3px rgba(0,0,0,.08); }
+.kpi .label { font-size: .85rem; color: #64748b; } .kpi .value { font-size: 1.5rem; font-weight: bold; }
+.row { display: grid; grid-template-columns: repeat(auto-fit, minmax(320px, 1fr)); gap: 12px; }
+.chart { min-height: 320px; background: #fff; border-radius: 10px; }
+.js-plotly-plot .plotly { touch-action: pan-y !important; }
+.note { background: #fff; border-left: 4px solid #3b82f6; padding: 10px; margin: 8px 0; border-radius: 6px; }
+nav a { margin-right: 12px; }
+"""
+
+# Charts are drawn when scrolled into view, so a phone only parses what it shows.
+# DOMContentLoaded fires after the deferred Plotly runtime has run.
+_SCRIPT = """
+document.addEventListener('DOMContentLoaded', () => {
+const CONFIG = Object.assign(%(config)s, {responsive: true});
+let template = null;
+async function draw(el) {
+  if (!template) template = await (await fetch('%(data)s/template.json')).json();
+  const fig = await (await fetch('%(data)s/' + el.dataset.fig + '.json')).json();
+  fig.layout.template = template;
+  Plotly.newPlot(el, fig.data, fig.layout, CONFIG);
+}
+const seen = new IntersectionObserver((entries) => entries.forEach((e) => {
+  if (e.isIntersecting) { seen.unobserve(e.target); draw(e.target); }
+}), {rootMargin: '200px'});
+document.querySelectorAll('[data-fig]').forEach((el) => seen.observe(el));
+});
+"""
+
+
+def _page(title, body, runtime, data_path):
+    script = _SCRIPT % {'config': json.dumps(figures.chart_config), 'data': data_path}
+    return (f'<!DOCTYPE html><html lang="th"><head><meta charset="utf-8">'
+            f'<meta name="viewport" content="width=device-width, initial-scale=1">'
+            f'<title>{html.escape(title)}</title><style>{_STYLE}</style>'
+            f'<script src="{runtime}" defer></script></head><body>'
+            f'<nav><a href="index.html">ผู้ป่วย</a><a href="finance.html">การเงิน</a></nav>'
+            f'{body}<script>{script}</script></body></html>')
+
+
+def _kpi(label, value):
+    return f'<div class="kpi"><div class="label">{html.escape(label)}</div><div class="value">{html.escape(value)}</div></div>'
+
+
+def _chart(title, name):
+    return f'<div><h2>{html.escape(title)}</h2><div class="chart" data-fig="{name}"></div></div>'
+
+
+def patient_page(agg):
+    village, risk = agg['village_counts'], agg['risk_df']
+    top_village = village.iloc[0] if not village.empty else {'Village': '-', 'Count': 0}
+    top_risk = risk.iloc[-1] if not risk.empty else {'Risk': '-', 'Count': 0}
+    return ''.join([
+        '<h1>Dashboard สรุปสถานการณ์ผู้ป่วยและการประเมินความเสี่ยง</h1>',
+        '<p>โครงการปรับสภาพแวดล้อมที่อยู่อาศัยสำหรับผู้ป่วย Stroke</p>',
+        '<div class="kpis">',
+        _kpi("ผู้ป่วยทั้งหมด (Total)", f"{agg['total']} คน"),
+        _kpi("กลุ่มวิกฤต (Critical)", f"{agg['critical']} คน"),
+        _kpi("บ้านเสี่ยงสูง (>5 จุด)", f"{agg['risky_homes']} หลัง"),
+        _kpi("ผู้ป่วยติดเตียง", f"{agg['bedridden']} คน"),
+        '</div><div class="row">',
+        _chart("จำนวนผู้ป่วยแยกตามหมู่บ้าน", 'village'),
+        _chart("สัดส่วนเพศ (ชาย/หญิง)", 'sex'),
+        _chart("สถานะการเคลื่อนไหว", 'mobility'),
+        _chart("ระดับความพึ่งพิง (ADL Group)", 'adl'),
+        _chart("ความเสี่ยงสภาพแวดล้อมที่พบมากที่สุด", 'risk'),
+        _chart("Matrix: สุขภาพ vs ความเสี่ยงบ้าน", 'risk_matrix'),
+        '</div>',
+        _chart("📅 ความคืบหน้าโครงการ (Project Progress)", 'progress'),
+        '<h2>การวิเคราะห์เชิงลึกและแผนดำเนินการ (Action Plan)</h2>',
+        f'<div class="note"><b>1. พื้นที่เป้าหมายเร่งด่วน:</b> <b>{html.escape(str(top_village["Village"]))}</b> '
+        f'(พบผู้ป่วย {top_village["Count"]} ราย) - ควรจัดทีม Mobile Unit ลงพื้นที่นี้เป็นลำดับแรก</div>',
+        f'<div class="note"><b>2. กลุ่มเป้าหมายวิกฤต (Critical Target):</b> พบผู้ป่วย <b>{agg["critical"]} ราย</b> '
+        f'ที่มีปัญหาสุขภาพรุนแรงและอาศัยในบ้านเสี่ยงสูง - การดำเนินการ: ติดตั้งราวจับและปรับพื้นห้องน้ำทันที</div>',
+        f'<div class="note"><b>3. ความเสี่ยงภาพรวม:</b> ปัญหาที่พบมากที่สุดคือ <b>"{html.escape(str(top_risk["Risk"]))}"</b> '
+        f'({top_risk["Count"]} ครัวเรือน) - ควรจัดหางบประมาณเพื่อจัดซื้ออุปกรณ์แก้ไขปัญหานี้โดยเฉพาะ</div>',
+    ])
+
+
+def finance_page(agg):
+    return ''.join([
+        '<h1>รายงานสรุปการเงินโครงการ Stroke Care</h1>',
+        f'<p><b>สถานะ:</b> ใช้งบประมาณ {agg["burn_rate"]:.1f}% | <b>ยอดรวม:</b> ฿{agg["budget"]:,.0f}</p>',
+        '<div class="kpis">',
+        _kpi("งบประมาณรวม", f"฿{agg['budget']:,.0f}"),
+        _kpi("ใช้จ่ายไปแล้ว", f"฿{agg['spend']:,.0f}"),
+        _kpi("คงเหลือ", f"฿{agg['balance']:,.0f}"),
+        _kpi("จำนวนรายการ", f"{agg['count']}"),
+        '</div><div class="row">',
+        _chart("กราฟแสดงงบประมาณคงเหลือ (Burndown)", 'burn'),
+        _chart("สัดส่วนค่าใช้จ่าย", 'pie'),
+        _chart("ยอดใช้จ่ายรายวัน (Daily Spending)", 'daily'),
+        _chart("ยอดใช้จ่ายสะสม (Cumulative Spending)", 'cumulative'),
+        '</div>',
+        _chart("10 อันดับ รายจ่ายสูงสุด (Top Spenders)", 'top'),
+        _chart("พยากรณ์การใช้งบประมาณ (Forecast)", 'forecast'),
+    ])
+
+
+# --- BUILD ---
+def build(out_dir=SITE_DIR, snapshot_dir=snapshot.SNAPSHOT_DIR, force=False):
+    """
+    Renders the bundle from the latest snapshot (building one if needed).
+    Returns (bundle version, built).
+    """
+    version = snapshot.latest(snapshot_dir)
+    if version is None:
+        version, _ = snapshot.build(snapshot_dir)
+    bundle = scoring._digest([version, BUNDLE_FORMAT])[:16]
+    version_file = os.path.join(out_dir, 'VERSION')
+    if not force and os.path.exists(version_file):
+        with open(version_file, encoding='utf-8') as f:
+            if f.read().strip() == bundle:
+                return bundle, False
+
+    patient_agg = snapshot.load_aggregates(version, 'patient', snapshot_dir)
+    ledger_agg = snapshot.load_aggregates(version, 'ledger', snapshot_dir)
+    charts = snapshot.load_figures(version, 'patient', snapshot_dir)
+    charts['risk_matrix'] = charts.pop('scatter')
+    charts.update(snapshot.load_figures(version, 'ledger', snapshot_dir))
+    charts['forecast'] = figures.forecast_figure(forecast.forecast(ledger_agg['budget'], ledger_agg['ledger_table']),
+                                                 ledger_agg['budget'])
+
+    os.makedirs(os.path.join(out_dir, 'data'), exist_ok=True)
+    runtime = _runtime(out_dir)
+    tmp = tempfile.mkdtemp(prefix='.build-', dir=os.path.join(out_dir, 'data'))
+    _write(os.path.join(tmp, 'template.json'), _template_json(next(iter(charts.values()))))
+    for name, fig in charts.items():
+        _write(os.path.join(tmp, f'{name}.json'), _figure_json(fig))
+    target = os.path.join(out_dir, 'data', bundle)
+    if os.path.isdir(target):
+        shutil.rmtree(target)
+    os.chmod(tmp, 0o755)  # mkdtemp creates it 0700: the web server couldn't list or read it
+    os.replace(tmp, target)
+
+    data_path = f'data/{bundle}'
+    _write(os.path.join(out_dir, 'index.html'),
+           _page("Stroke Care Dashboard", patient_page(patient_agg), runtime, data_path))
+    _write(os.path.join(out_dir, 'finance.html'),
+           _page("รายงานการเงินโครงการ Stroke Care", finance_page(ledger_agg), runtime, data_path))
+    with open(version_file, 'w', encoding='utf-8') as f:
+        f.write(bundle)
+    prune(out_dir)
+    return bundle, True
+
+
+def prune(out_dir=SITE_DIR, keep=KEEP_BUNDLES):
+    """Keeps the newest `keep` data bundles (pages cached on a phone may still point at the previous one)."""
+    data_dir = os.path.join(out_dir, 'data')
+    bundles = [d for d in os.listdir(data_dir) if not d.startswith('.')]
+    bundles.sort(key=lambda d: os.path.getmtime(os.path.join(data_dir, d)), reverse=True)
+    for bundle in bundles[keep:]:
+        shutil.rmtree(os.path.join(data_dir, bundle))
+
+
+# --- CLI ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Static HTML/JSON bundle of the Stroke Care dashboards")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_build = sub.add_parser('build', help="render the bundle from the latest snapshot")
+    p_build.add_argument('--out', default=SITE_DIR)
+    p_build.add_argument('--snapshots', default=snapshot.SNAPSHOT_DIR)
+    p_build.add_argument('--force', action='store_true', help="rebuild even if the data is unchanged")
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        bundle, built = build(args.out, args.snapshots, args.force)
+        print(f"{args.out}: {bundle} {'built' if built else 'unchanged'}")
+
+
+if __name__ == '__main__':
+    main()
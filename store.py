@@ -0,0 +1,273 @@
+"""
+Optional SQLite backend for the dashboards.
+
+    python store.py ingest [--db stroke.db] [--csv file.csv] [--xlsx payment.xlsx]
+
+loads the survey export and the finance workbook once, scores them and writes
+indexed `patients` / `ledger` tables. When the database exists the dashboards
+run their counts, filters and top-N lists as SQL and only pull back the small
+result frames defined in aggregates.py.
+"""
+import argparse
+import os
+import sqlite3
+
+import aggregates
+import lazy
+import ledger
+import pseudonym
+import scoring
+import validation
+
+pd = lazy.module('pandas')
+
+DB_PATH = os.environ.get('STROKE_DB', 'stroke.db')
+
+_INDEXES = [
+    ('idx_patients_village', 'patients', 'village'),
+    ('idx_patients_adl_group', 'patients', 'adl_group'),
+    ('idx_patients_submitted_at', 'patients', 'submitted_at'),
+    ('idx_patients_adl_score', 'patients', 'adl_score, seq'),  # patient list pages
+    ('idx_ledger_date_group', 'ledger', 'date_group'),
+]
+
+
+def available(db_path=DB_PATH, rules=None):
+    """True when the database exists and was ingested with the current rules.json."""
+    if not os.path.exists(db_path):
+        return False
+    rules = scoring.load_rules() if rules is None else rules
+    # Derived columns (Is_Critical, ADL_Group, ...) are stored: stale after a rules change
+    if _meta(db_path, 'rules_hash') != scoring.rules_hash(rules):
+        return False
+    # The public deployment only uses a database ingested with pseudonyms
+    return not pseudonym.PUBLIC or is_public(db_path)
+
+
+def _meta(db_path, key):
+    conn = connect(db_path)
+    try:
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    except sqlite3.OperationalError:
+        row = None
+    conn.close()
+    return None if row is None else row[0]
+
+
+def is_public(db_path=DB_PATH):
+    return _meta(db_path, 'public') == '1'
+
+
+def version(db_path=DB_PATH):
+    """Changes whenever the database is re-ingested; use it as a cache key."""
+    return os.path.getmtime(db_path)
+
+
+def connect(db_path=DB_PATH):
+    return sqlite3.connect(db_path, check_same_thread=False)
+
+
+# --- INGEST ---
+def patient_rows(df, rules):
+    """Flattens a scored survey frame into the `patients` table layout."""
+    cols = rules['columns']
+    spec = rules['validation']
+    hits = scoring.env_hits(df, rules).astype(int)
+    items = scoring.adl_matrix(df, rules)
+    rows = pd.DataFrame({
+        'submitted_at': pd.to_datetime(df.iloc[:, cols['timestamp']], format=spec['timestamp_format'], errors='coerce'),
+        'name': df.iloc[:, cols['name']].astype(str),
+        'address': df.iloc[:, cols['address']].astype(str),
+        'phone': df.iloc[:, cols['phone']].astype(str),
+        'village': df['Village'],
+        'sex': df['Sex'],
+        'env_risk_score': df['Env_Risk_Score'],
+        'adl_score': df['ADL_Score'],
+        'adl_group': df['ADL_Group'],
+        'mobility_label': df['Mobility_Label'],
+        'is_critical': df['Is_Critical'].astype(int),
+        'is_risky_home': df['Is_Risky_Home'].astype(int),
+        'dq_flags': df['DQ_Flags'].astype(int),
+    })
+    for i in range(hits.shape[1]):
+        rows[f'env_{i + 1}'] = hits.iloc[:, i].to_numpy()
+    for i in range(items.shape[1]):
+        rows[f'adl_{i + 1}'] = items[:, i].astype(int)
+    return rows
+
+
+def ledger_rows(df_exp):
+    rows = df_exp[['Item', 'Date_Group', 'Category', 'Expense']].reset_index(drop=True)
+    rows.columns = ['item', 'date_group', 'category', 'expense']
+    return rows
+
+
+def ingest(db_path=DB_PATH, csv_path='file.csv', xlsx_path=ledger.LEDGER_PATH, rules=None, public=None):
+    rules = scoring.load_rules() if rules is None else rules
+    public = pseudonym.PUBLIC if public is None else public
+    df = scoring.score(pd.read_csv(csv_path), rules)
+    df['DQ_Flags'] = validation.validate(df, rules)
+    if public:
+        pseudonym.anonymize(df, rules)
+    budget, df_exp = ledger.load_ledger(xlsx_path)
+
+    conn = connect(db_path)
+    with conn:
+        # `seq` keeps the export order, which the ledger running totals depend on
+        patient_rows(df, rules).to_sql('patients', conn, if_exists='replace', index=True, index_label='seq')
+        ledger_rows(df_exp).to_sql('ledger', conn, if_exists='replace', index=True, index_label='seq')
+        pd.DataFrame({'key': ['budget', 'rules_hash', 'public'],
+                      'value': [str(budget), scoring.rules_hash(rules), '1' if public else '0']}) \
+            .to_sql('meta', conn, if_exists='replace', index=False)
+        for name, table, column in _INDEXES:
+            conn.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({column})')
+    conn.close()
+    return len(df), len(df_exp)
+
+
+# --- QUERIES ---
+def _query(conn, sql, params=()):
+    return pd.read_sql_query(sql, conn, params=params)
+
+
+def _scalar(conn, sql, params=()):
+    return conn.execute(sql, params).fetchone()[0]
+
+
+def _counts(conn, column, name):
+    # Ties keep first-appearance order, same as pandas value_counts()
+    return _query(conn, f'SELECT {column} AS "{name}", COUNT(*) AS Count FROM patients '
+                        f'GROUP BY {column} ORDER BY Count DESC, MIN(seq)')
+
+
+def _patient_table_sql(village=None, adl_group=None, limit=None, critical_only=False, offset=0):
+    where, params = [], []
+    if critical_only:
+        where.append('is_critical = 1')
+    if village is not None:
+        where.append('village = ?')
+        params.append(village)
+    if adl_group is not None:
+        where.append('adl_group = ?')
+        params.append(adl_group)
+    sql = 'SELECT name, village, adl_score, env_risk_score, adl_group FROM patients'
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += ' ORDER BY adl_score, seq'
+    if limit is not None:
+        sql += ' LIMIT ? OFFSET ?'
+        params += [int(limit), int(offset)]
+    return sql, params
+
+
+def patient_table(conn, rules, village=None, adl_group=None, limit=None, critical_only=False, offset=0):
+    table_df = _query(conn, *_patient_table_sql(village, adl_group, limit, critical_only, offset))
+    table_df.columns = aggregates.PATIENT_TABLE_COLUMNS
+    return table_df
+
+
+def patient_table_chunks(conn, rules, village=None, adl_group=None, critical_only=False, chunk_rows=5000):
+    """Same rows as patient_table, read `chunk_rows` at a time (for exports)."""
+    sql, params = _patient_table_sql(village, adl_group, None, critical_only)
+    for chunk in pd.read_sql_query(sql, conn, params=params, chunksize=chunk_rows):
+        chunk.columns = aggregates.PATIENT_TABLE_COLUMNS
+        yield chunk
+
+
+def villages(conn):
+    return sorted((v for (v,) in conn.execute('SELECT DISTINCT village FROM patients')), key=scoring.natural_key)
+
+
+def adl_item_rows(conn, rules):
+    """(N x 10 uint8 item matrix, villages, ADL groups) read from the adl_n columns."""
+    items = ', '.join(f'adl_{i + 1}' for i in range(len(rules['adl_labels'])))
+    rows = _query(conn, f'SELECT village, adl_group, {items} FROM patients ORDER BY seq')
+    return rows.iloc[:, 2:].to_numpy(dtype='uint8'), rows['village'].to_numpy(), rows['adl_group'].to_numpy()
+
+
+def patient_aggregates(conn, rules):
+    order = scoring.adl_group_order(rules)
+    labels = rules['env_labels']
+
+    hit_sums = ', '.join(f'SUM(env_{i + 1})' for i in range(len(labels)))
+    risk_counts = conn.execute(f'SELECT {hit_sums} FROM patients').fetchone()
+    risk_df = pd.DataFrame({'Risk': labels, 'Count': [int(c or 0) for c in risk_counts]}) \
+        .sort_values('Count', ascending=True)
+
+    adl_counts = _counts(conn, 'adl_group', 'Group').set_index('Group')['Count'] \
+        .reindex(order, fill_value=0).rename_axis('Group').reset_index()
+
+    risk_cells = _query(conn, 'SELECT adl_score AS ADL_Score, env_risk_score AS Env_Risk_Score, COUNT(*) AS Count '
+                              'FROM patients GROUP BY adl_score, env_risk_score ORDER BY adl_score, env_risk_score')
+
+    flags = _query(conn, 'SELECT dq_flags FROM patients WHERE dq_flags > 0')['dq_flags']
+    dq_table = _query(conn, 'SELECT name, village, dq_flags FROM patients WHERE dq_flags > 0 ORDER BY seq')
+    dq_table['dq_flags'] = dq_table['dq_flags'].map(validation.describe)
+    dq_table.columns = ['ชื่อ-สกุล', 'หมู่บ้าน', 'ปัญหา']
+
+    total, critical, risky_homes, bedridden = conn.execute(
+        'SELECT COUNT(*), COALESCE(SUM(is_critical), 0), COALESCE(SUM(is_risky_home), 0), '
+        'COALESCE(SUM(mobility_label = ?), 0) FROM patients', (aggregates.bedridden_label(rules),)).fetchone()
+
+    return {
+        'total': total,
+        'critical': critical,
+        'risky_homes': risky_homes,
+        'bedridden': bedridden,
+        'village_counts': _counts(conn, 'village', 'Village'),
+        'sex_counts': _counts(conn, 'sex', 'Sex'),
+        'mobility_counts': _counts(conn, 'mobility_label', 'Status'),
+        'adl_counts': adl_counts,
+        'risk_df': risk_df,
+        'risk_cells': risk_cells,
+        'dq_summary': validation.summary(flags.astype('uint8')),
+        'dq_table': dq_table,
+    }
+
+
+def ledger_aggregates(conn):
+    budget = float(_scalar(conn, "SELECT value FROM meta WHERE key = 'budget'"))
+    total_spend, count = conn.execute('SELECT COALESCE(SUM(expense), 0), COUNT(*) FROM ledger').fetchone()
+
+    running = _query(conn, 'SELECT SUM(expense) OVER (ORDER BY seq) AS Cumulative FROM ledger ORDER BY seq')
+    running['Run_Balance'] = budget - running['Cumulative']
+
+    ledger_table = _query(conn, 'SELECT item, date_group, category, expense FROM ledger ORDER BY seq')
+    ledger_table.columns = aggregates.LEDGER_TABLE_COLUMNS
+
+    return {
+        'budget': budget,
+        'spend': total_spend,
+        'balance': budget - total_spend,
+        'burn_rate': (total_spend / budget) * 100,
+        'count': count,
+        'running': running,
+        'cat_sum': _query(conn, 'SELECT category AS Category, SUM(expense) AS Expense FROM ledger '
+                                'GROUP BY category ORDER BY category'),
+        'daily_sum': _query(conn, 'SELECT date_group AS Date_Group, SUM(expense) AS Expense FROM ledger '
+                                  'GROUP BY date_group ORDER BY date_group'),
+        'top_10': _query(conn, 'SELECT item AS Item, expense AS Expense FROM ledger '
+                               'ORDER BY expense DESC, seq LIMIT 10'),
+        'ledger_table': ledger_table,
+    }
+
+
+# --- CLI ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stroke Care SQLite store")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_ingest = sub.add_parser('ingest', help="load file.csv / payment.xlsx into the database")
+    p_ingest.add_argument('--db', default=DB_PATH)
+    p_ingest.add_argument('--csv', default='file.csv')
+    p_ingest.add_argument('--xlsx', default=ledger.LEDGER_PATH)
+    p_ingest.add_argument('--public', action='store_true', default=pseudonym.PUBLIC,
+                          help="pseudonymize names, addresses and phones (default: STROKE_PUBLIC)")
+    args = parser.parse_args(argv)
+
+    if args.command == 'ingest':
+        n_patients, n_ledger = ingest(args.db, args.csv, args.xlsx, public=args.public)
+        print(f"{args.db}: {n_patients} patients, {n_ledger} ledger rows")
+
+
+if __name__ == '__main__':
+    main()
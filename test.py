@@ -1,8 +1,11 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-import re
+
+import lazy
+import scoring
+import shared
+import validation
+
+px = lazy.module('plotly.express')
 
 # --- 1. PAGE CONFIGURATION ---
 st.set_page_config(
@@ -21,76 +24,34 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- 2. LOAD & PROCESS DATA ---
-@st.cache_data
-def load_data():
+# The scored frame lives once per host in shared memory (see shared.py);
+# cache_resource hands every session that same read-only frame instead of a copy
+@st.cache_resource
+def load_data(rules):
     try:
-        df = pd.read_csv('file.csv') 
+        # Thresholds, column mappings and labels all come from rules.json (see scoring.py)
+        df = shared.scored_patients(rules)
     except:
-        st.error("ไม่พบไฟล์ 'file.csv' กรุณาตรวจสอบว่าไฟล์อยู่ในโฟลเดอร์เดียวกัน")
         return None
 
-    # Processing Logic
-    env_cols = df.columns[6:16] 
-    env_labels_map = {
-        df.columns[6]: "สีไม่ชัดเจน", df.columns[7]: "พื้นลื่น/มีพรม",
-        df.columns[8]: "ของวางเกะกะ", df.columns[9]: "แสงสว่างน้อย",
-        df.columns[10]: "แสงเปลี่ยนกะทันหัน", df.columns[11]: "ไม่มีราวพยุง",
-        df.columns[12]: "ห้องนอนชั้นบน", df.columns[13]: "เตียงสูง/ต่ำเกินไป",
-        df.columns[14]: "พื้นต่างระดับ", df.columns[15]: "ระบายอากาศไม่ดี"
-    }
-    
-    # 1. Clean Village Name
-    def get_moo(address):
-        match = re.search(r'(?:หมู่|ม\.|Moo)\.?\s*(\d+)', str(address))
-        return f"หมู่ {match.group(1)}" if match else "ไม่ระบุ"
-    df['Village'] = df[df.columns[2]].apply(get_moo)
-
-    # 2. EXTRACT SEX FROM NAME
-    name_col = df.columns[1] 
-    def extract_sex(name):
-        n = str(name).strip()
-        if n.startswith("นาย"):
-            return "ชาย"
-        elif n.startswith("นาง") or n.startswith("นางสาว") or n.startswith("น.ส."):
-            return "หญิง"
-        else:
-            return "ไม่ระบุ"
-    df['Sex'] = df[name_col].apply(extract_sex)
-    
-    # 3. Calculate Risk Score
-    df['Env_Risk_Score'] = df.apply(lambda row: sum(1 for c in env_cols if "ใช่" in str(row[c]) and "ไม่ใช่" not in str(row[c])), axis=1)
-    
-    # 4. Calculate ADL Score
-    adl_cols = df.columns[16:26]
-    df['ADL_Score'] = df[adl_cols].applymap(lambda x: int(str(x).strip()[0]) if pd.notna(x) and str(x).strip()[0].isdigit() else 0).sum(axis=1)
-    
-    # 5. ADL Group
-    def categorize_adl(score):
-        if score >= 12: 
-            return "กลุ่มที่ 1: ช่วยเหลือตัวเองได้ (12-20)"
-        elif score >= 5: 
-            return "กลุ่มที่ 2: ดูแลตนเองได้บ้าง (5-11)"
-        else: 
-            return "กลุ่มที่ 3: ช่วยเหลือตัวเองไม่ได้ (0-4)"
-    df['ADL_Group'] = df['ADL_Score'].apply(categorize_adl)
-
-    # 6. Mobility Status
-    mobility_col = df.columns[20]
-    mobility_map = {'3': "ช่วยเหลือตัวเองได้", '2': "ต้องการผู้ช่วย", '1': "นั่งรถเข็น", '0': "ติดเตียง"}
-    df['Mobility_Label'] = df[mobility_col].astype(str).str[0].map(mobility_map).fillna("ไม่ระบุ")
+    env_cols = scoring.env_columns(df, rules)
+    env_labels_map = scoring.env_labels(df, rules)
+    name_col = scoring.name_column(df, rules)
 
     return df, env_cols, env_labels_map, name_col
 
-data_load = load_data()
+rules = scoring.load_rules()
+data_load = load_data(rules)
 if data_load is None:
+    st.error("ไม่พบไฟล์ 'file.csv' กรุณาตรวจสอบว่าไฟล์อยู่ในโฟลเดอร์เดียวกัน")
     st.stop()
 df, env_cols, env_labels_map, name_col_index = data_load
 
 # KPI Calculations
 total_patients = len(df)
-critical_df = df[(df['ADL_Score'] < 10) & (df['Env_Risk_Score'] >= 3)]
+critical_df = df[df['Is_Critical']]
 critical_count = len(critical_df)
-risky_homes = len(df[df['Env_Risk_Score'] >= 5])
+risky_homes = int(df['Is_Risky_Home'].sum())
 bedridden = len(df[df['Mobility_Label'] == 'ติดเตียง'])
 
 # --- 3. DASHBOARD LAYOUT ---
@@ -98,6 +59,17 @@ bedridden = len(df[df['Mobility_Label'] == 'ติดเตียง'])
 # HEADER
 st.title("Dashboard สรุปสถานการณ์ผู้ป่วยและการประเมินความเสี่ยง")
 st.markdown("โครงการปรับสภาพแวดล้อมที่อยู่อาศัยสำหรับผู้ป่วย Stroke")
+
+# DATA QUALITY (only shown when the export has problems)
+flagged = df[df['DQ_Flags'] > 0]
+if not flagged.empty:
+    with st.expander(f"⚠️ พบปัญหาคุณภาพข้อมูล {len(flagged)} แถว (Data Quality)"):
+        st.dataframe(validation.summary(df['DQ_Flags']), use_container_width=True, hide_index=True)
+        dq_table = flagged[[name_col_index, 'Village']].copy()
+        dq_table['ปัญหา'] = flagged['DQ_Flags'].map(validation.describe)
+        dq_table.columns = ['ชื่อ-สกุล', 'หมู่บ้าน', 'ปัญหา']
+        st.dataframe(dq_table, use_container_width=True)
+
 st.markdown("---")
 
 # ROW 1: KPI CARDS
@@ -154,19 +126,11 @@ with r3_c1:
 
 with r3_c2:
     st.subheader("ระดับความพึ่งพิง (ADL Group)")
-    order = [
-        "กลุ่มที่ 3: ช่วยเหลือตัวเองไม่ได้ (0-4)",
-        "กลุ่มที่ 2: ดูแลตนเองได้บ้าง (5-11)",
-        "กลุ่มที่ 1: ช่วยเหลือตัวเองได้ (12-20)"
-    ]
+    order = scoring.adl_group_order(rules)
     adl_counts = df['ADL_Group'].value_counts().reindex(order, fill_value=0).reset_index()
     adl_counts.columns = ['Group', 'Count']
     
-    color_map_adl = {
-        "กลุ่มที่ 3: ช่วยเหลือตัวเองไม่ได้ (0-4)": "#ef4444", 
-        "กลุ่มที่ 2: ดูแลตนเองได้บ้าง (5-11)": "#f59e0b",
-        "กลุ่มที่ 1: ช่วยเหลือตัวเองได้ (12-20)": "#10b981"
-    }
+    color_map_adl = dict(zip(order, ["#ef4444", "#f59e0b", "#10b981"]))
     
     fig_adl = px.pie(adl_counts, values='Count', names='Group', hole=0.4,
                      color='Group', color_discrete_map=color_map_adl)
@@ -182,13 +146,9 @@ r4_c1, r4_c2 = st.columns(2)
 
 with r4_c1:
     st.subheader("ความเสี่ยงสภาพแวดล้อมที่พบมากที่สุด")
-    risk_data = {}
-    for col in env_cols:
-        label = env_labels_map.get(col, col)
-        count = df[col].astype(str).apply(lambda x: "ใช่" in x and "ไม่ใช่" not in x).sum()
-        risk_data[label] = count
+    risk_counts = scoring.env_hits(df, rules).sum().rename(index=env_labels_map)
     
-    risk_df = pd.DataFrame(list(risk_data.items()), columns=['Risk', 'Count']).sort_values('Count', ascending=True)
+    risk_df = risk_counts.rename_axis('Risk').reset_index(name='Count').sort_values('Count', ascending=True)
     
     fig_risk = px.bar(risk_df, x='Count', y='Risk', text='Count', orientation='h',
                       color='Count', color_continuous_scale='Blues')
@@ -203,8 +163,8 @@ with r4_c2:
                              color_continuous_scale='Reds',
                              labels={'ADL_Score': 'คะแนนสุขภาพ (ADL)', 'Env_Risk_Score': 'คะแนนความเสี่ยงบ้าน'})
     
-    fig_scatter.add_shape(type="rect", x0=0, y0=5, x1=10, y1=10, line=dict(color="Red", width=2, dash="dash"))
-    fig_scatter.add_annotation(x=5, y=9.5, text="CRITICAL ZONE", showarrow=False, font=dict(color="red", size=14))
+    fig_scatter.add_shape(type="rect", x0=0, y0=rules['risky_home']['risk_at_least'], x1=rules['critical']['adl_below'], y1=10, line=dict(color="Red", width=2, dash="dash"))
+    fig_scatter.add_annotation(x=rules['critical']['adl_below'] / 2, y=9.5, text="CRITICAL ZONE", showarrow=False, font=dict(color="red", size=14))
     
     fig_scatter.update_xaxes(range=[-1, 21])
     fig_scatter.update_yaxes(range=[-1, 11])
@@ -223,7 +183,7 @@ if not risk_df.empty:
 else:
     top_risk = {'Risk': 'ไม่มีข้อมูล', 'Count': 0}
 
-st.info(f"**1. พื้นที่เป้าหมายเร่งด่วน:** **{top_village['Village']}** (พบผู้ป่วย {top_village['Count']} ราย) - ควรจัดทีม Mobile Unit ลงพื้นที่นี้เป็นลำดับแรก")
+st.info(f"**1. พื้นที่เป้าหมายเร่งด่วน:** **{top_village['Village']}** (พบผู้ป่วย {top_village['Count']} ราย) - ควรจัดทีม Mobile Unit ลงพื้นที่นี้เป็นลำดับแรก (แผนเยี่ยมบ้านรายวันของแต่ละทีม: `streamlit run visitPlan.py`)")
 st.error(f"**2. กลุ่มเป้าหมายวิกฤต (Critical Target):** พบผู้ป่วย **{critical_count} ราย** ที่มีปัญหาสุขภาพรุนแรงและอาศัยในบ้านเสี่ยงสูง - การดำเนินการ: ติดตั้งราวจับและปรับพื้นห้องน้ำทันที")
 st.warning(f"**3. ความเสี่ยงภาพรวม:** ปัญหาที่พบมากที่สุดคือ **\"{top_risk['Risk']}\"** ({top_risk['Count']} ครัวเรือน) - ควรจัดหางบประมาณเพื่อจัดซื้ออุปกรณ์แก้ไขปัญหานี้โดยเฉพาะ")
 
@@ -233,7 +193,7 @@ st.header("📋 รายชื่อผู้ป่วยและคะแน
 
 # Select Columns: Name, Village, ADL Score, Risk Score
 # Use the dynamic column name we identified earlier
-table_df = df[[name_col_index, 'Village', 'ADL_Score', 'Env_Risk_Score', 'ADL_Group']].copy()
+table_df = df[[name_col_index, 'Village', 'ADL_Score', 'Env_Risk_Score', 'ADL_Group']]
 table_df.columns = ['ชื่อ-สกุล', 'หมู่บ้าน', 'คะแนน ADL (เต็ม 20)', 'คะแนนความเสี่ยงบ้าน (เต็ม 10)', 'กลุ่มอาการ']
 
 # Sort by ADL Score (Ascending) so sickest patients are top
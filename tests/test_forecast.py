@@ -0,0 +1,51 @@
+import pandas as pd
+
+import aggregates
+import forecast
+
+# The food / drinks rows of payment.xlsx (Dec 2568): mostly the 630-baht drinks
+# order, plus the bigger meal + break bills on meeting days.
+FOOD = [
+    ('น้ำดื่ม กาแฟ ชา แก้ว', 'วันที่ 4 ธ.ค.68', 633),
+    ('ค่าอาหาร+เบรก', 'วันที่ 4 ธ.ค.68', 720),
+    ('น้ำดื่ม กาแฟ ชา แก้ว', 'วันที่ 9 ธ.ค.68', 630),
+    ('ค่าอาหาร+เบรก', 'วันที่ 9 ธ.ค.68', 840),
+    ('น้ำดื่ม กาแฟ ชา แก้ว', 'วันที่ 12 ธ.ค.68', 630),
+    ('ค่าอาหาร+เบรก', 'วันที่ 12 ธ.ค.68', 2645),
+    ('น้ำดื่ม กาแฟ ชา แก้ว', 'วันที่ 15 ธ.ค.68', 630),
+    ('ค่าอาหาร+เบรก', 'วันที่ 15 ธ.ค.68', 1800),
+    ('น้ำดื่ม กาแฟ ชา แก้ว', 'วันที่ 25 ธ.ค.68', 630),
+    ('ค่าอาหาร+เบรก', 'วันที่ 25 ธ.ค.68', 2575),
+    ('น้ำดื่ม กาแฟ ชา แก้ว', 'วันที่ 26 ธ.ค.68', 630),
+    ('น้ำดื่ม กาแฟ ชา แก้ว', 'วันที่ 28 ธ.ค.68', 630),
+]
+FOOD_CATEGORY = 'ค่าอาหาร/เครื่องดื่ม'
+
+
+def _table(rows, category=FOOD_CATEGORY):
+    return pd.DataFrame([(item, date, category, amount) for item, date, amount in rows],
+                        columns=aggregates.LEDGER_TABLE_COLUMNS)
+
+
+def test_meal_bills_are_not_outliers_next_to_repeated_drinks_price():
+    assert forecast.outliers(_table(FOOD)).empty
+
+
+def test_real_outlier_is_still_flagged():
+    flagged = forecast.outliers(_table(FOOD + [('ค่าอาหาร+เบรก', 'วันที่ 28 ธ.ค.68', 63000)]))
+    assert flagged['Expense'].tolist() == [63000]
+    assert flagged['Robust_Z'].iloc[0] > forecast.OUTLIER_Z
+
+
+def test_small_category_is_not_scored():
+    rows = [('ค่าเช่าแท็ปเล็ต', 'วันที่ 25 ธ.ค.68', 24000), ('ค่าวัสดุ', 'วันที่ 26 ธ.ค.68', 16357),
+            ('ค่าวัสดุ', 'วันที่ 28 ธ.ค.68', 16357), ('ค่าวัสดุ', 'วันที่ 28 ธ.ค.68', 90000)]
+    assert forecast.outliers(_table(rows, 'ค่าวัสดุ/อุปกรณ์')).empty
+
+
+def test_ledger_has_no_outliers():
+    import ledger
+    _, df_exp = ledger.load_ledger()
+    table = df_exp[['Item', 'Date_Group', 'Category', 'Expense']]
+    table.columns = aggregates.LEDGER_TABLE_COLUMNS
+    assert forecast.outliers(table).empty
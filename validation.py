@@ -0,0 +1,78 @@
+import lazy
+import scoring
+
+np = lazy.module('numpy')
+pd = lazy.module('pandas')
+
+# --- FLAG BITS ---
+# One bit per problem so a single uint8 column records everything wrong with a row.
+ADL_UNPARSEABLE = 1
+ADL_OUT_OF_RANGE = 2
+BAD_PHONE = 4
+MISSING_VILLAGE = 8
+DUPLICATE = 16
+BAD_TIMESTAMP = 32
+
+FLAG_LABELS = {
+    ADL_UNPARSEABLE: "คำตอบ ADL อ่านไม่ได้",
+    ADL_OUT_OF_RANGE: "คะแนน ADL เกินช่วง",
+    BAD_PHONE: "เบอร์โทรศัพท์ไม่ถูกต้อง",
+    MISSING_VILLAGE: "ไม่พบหมู่ในที่อยู่",
+    DUPLICATE: "ส่งข้อมูลซ้ำ",
+    BAD_TIMESTAMP: "ประทับเวลาผิดปกติ",
+}
+
+
+def validate(df, rules, now=None):
+    """
+    Returns a uint8 bitmask per row. Expects a frame already passed through
+    scoring.score() (the Village and ADL item columns are reused rather than re-parsed).
+    Every check works on whole columns, so the cost is a few vectorized
+    passes regardless of row count.
+    """
+    spec = rules['validation']
+    cols = rules['columns']
+    flags = np.zeros(len(df), dtype=np.uint8)
+
+    # ADL: unparseable answers and scores above the item maximum, from the
+    # item columns scoring already parsed
+    flags |= np.where(df['ADL_Unparsed'].to_numpy(), ADL_UNPARSEABLE, 0).astype(np.uint8)
+    item_max = np.asarray(spec['adl_item_max'])
+    over = (scoring.adl_matrix(df, rules) > item_max).any(axis=1)
+    flags |= np.where(over, ADL_OUT_OF_RANGE, 0).astype(np.uint8)
+
+    # Phone: strip separators, skip explicit "no phone" answers
+    phone = df.iloc[:, cols['phone']].fillna('').astype(str).str.strip()
+    digits_only = phone.str.replace(r'[\s-]', '', regex=True)
+    bad_phone = ~phone.isin(spec['phone_missing']) & ~digits_only.str.match(spec['phone_pattern'])
+    flags |= np.where(bad_phone.to_numpy(), BAD_PHONE, 0).astype(np.uint8)
+
+    # Village: address did not yield a หมู่ number
+    missing_village = (df['Village'] == rules['village']['missing']).to_numpy()
+    flags |= np.where(missing_village, MISSING_VILLAGE, 0).astype(np.uint8)
+
+    # Duplicates: every repeat after the first submission of the same key
+    key = [df.columns[cols[k]] for k in spec['duplicate_key']]
+    key_values = df[key].astype(str).apply(lambda s: s.str.strip())
+    flags |= np.where(key_values.duplicated(keep='first').to_numpy(), DUPLICATE, 0).astype(np.uint8)
+
+    # Timestamps: unparseable or in the future
+    now = pd.Timestamp.now() if now is None else now
+    stamps = pd.to_datetime(df.iloc[:, cols['timestamp']], format=spec['timestamp_format'], errors='coerce')
+    bad_stamp = (stamps.isna() | (stamps > now)).to_numpy()
+    flags |= np.where(bad_stamp, BAD_TIMESTAMP, 0).astype(np.uint8)
+
+    return pd.Series(flags, index=df.index, name='DQ_Flags')
+
+
+def summary(flags):
+    """Row count per problem, only listing problems that actually occur."""
+    values = flags.to_numpy()
+    rows = [(label, int(np.count_nonzero(values & bit))) for bit, label in FLAG_LABELS.items()]
+    report = pd.DataFrame(rows, columns=['ปัญหา', 'จำนวนแถว'])
+    return report[report['จำนวนแถว'] > 0].reset_index(drop=True)
+
+
+def describe(flag):
+    """Human-readable list of problems for one row's bitmask."""
+    return ", ".join(label for bit, label in FLAG_LABELS.items() if flag & bit)
@@ -0,0 +1,137 @@
+from datetime import date
+
+import streamlit as st
+
+import export
+import planner
+import scoring
+import shared
+import snapshot
+
+# --- 1. PAGE CONFIGURATION ---
+st.set_page_config(
+    page_title="Stroke Care Dashboard",
+    layout="wide",
+    initial_sidebar_state="collapsed"
+)
+
+# --- 2. CSS WITH MOBILE SCROLL FIX ---
+st.markdown("""
+<style>
+    h1, h2, h3 { font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; }
+
+    /* Force charts to fit width */
+    .js-plotly-plot { width: 100% !important; }
+
+    /* --- MOBILE SCROLL FIX --- */
+    .js-plotly-plot .plotly {
+        touch-action: pan-y !important;
+    }
+</style>
+""", unsafe_allow_html=True)
+
+# --- 3. LOAD & PROCESS DATA ---
+CSV_PATH = 'file.csv'
+
+@st.cache_data
+def load_candidates(rules, source, version, critical_only):
+    try:
+        if source == 'snapshot':
+            df = snapshot.load_frame(version, 'patients')
+        else:
+            # Scored once per host and shared between worker processes (see shared.py)
+            df = shared.scored_patients(rules, CSV_PATH)
+    except:
+        return None
+    return planner.candidates(df, rules, critical_only)
+
+# Keeps the last plan so a new export only moves what it has to
+@st.cache_resource
+def visit_planner():
+    return planner.VisitPlanner()
+
+@st.cache_data
+def load_plan(rules, version, distances_version, visits_version, teams, days, critical_only, locked_days, start,
+              _cand, _travel, _visited):
+    result = visit_planner().update(_cand, _travel, teams, days, rules, locked_days, scope=critical_only,
+                                    start=start, visited=_visited)
+    return result, planner.schedule_table(result), planner.route_table(result)
+
+rules = scoring.load_rules()
+source, version = shared.data_source(rules, CSV_PATH)
+
+st.title("แผนออกเยี่ยมบ้านของทีม Mobile Unit (Visit Plan)")
+
+c1, c2, c3, c4 = st.columns(4)
+teams = c1.number_input("จำนวนทีม", min_value=1, max_value=20, value=2)
+days = c2.number_input("จำนวนวัน", min_value=1, max_value=90, value=5)
+critical_only = not c3.checkbox("รวมผู้ป่วยที่ไม่อยู่ในกลุ่มวิกฤต")
+locked_days = 1 if c4.checkbox("คงแผนวันแรกไว้ (ทีมออกพื้นที่แล้ว)") else 0
+
+cand = load_candidates(rules, source, version, critical_only)
+
+if cand is None:
+    st.error("ไม่พบไฟล์ 'file.csv' กรุณาตรวจสอบว่าไฟล์อยู่ในโฟลเดอร์เดียวกัน")
+    st.stop()
+
+distances = planner.load_distances()
+distances_version = None if distances is None else scoring.data_hash(distances)
+travel = planner.travel_matrix(cand['Village'], distances, rules)
+# Confirmed visits leave the plan; a past route alone doesn't mean the visit happened
+visits = planner.load_visits()
+visits_version = scoring.data_hash(visits)
+start = date.today()
+result, schedule_df, routes_df = load_plan(rules, version, distances_version, visits_version, teams, days,
+                                           critical_only, locked_days, start, cand, travel, visits['Patient_Key'])
+
+# --- 4. DASHBOARD LAYOUT ---
+
+if distances is None:
+    spec = rules['visit_plan']
+    st.info(f"ยังไม่มีตารางระยะทาง '{planner.DISTANCES_PATH}' ใช้เวลาเดินทางระหว่างหมู่บ้าน "
+            f"{spec['default_travel_minutes']} นาที (สร้างตารางได้ด้วย `python planner.py distances-template`)")
+
+k1, k2, k3 = st.columns(3)
+k1.metric("ผู้ป่วยในแผน", f"{len(schedule_df)} คน")
+k2.metric("ครอบคลุมความรุนแรง", f"{100 * result['covered'] / result['total']:.0f}%" if result['total'] else "-")
+k3.metric("รอจัดรอบถัดไป", f"{len(result['waiting'])} คน")
+
+st.markdown("---")
+
+st.subheader("เส้นทางรายวัน")
+st.dataframe(routes_df, use_container_width=True, hide_index=True)
+
+st.subheader("ลำดับการเยี่ยมบ้าน")
+day = st.selectbox("วันที่", sorted({r['date'] for r in result['routes']}),
+                   format_func=lambda d: d.strftime('%d/%m/%Y'))
+st.dataframe(schedule_df[schedule_df[planner.PLAN_COLUMNS[0]] == day], use_container_width=True, hide_index=True)
+
+names = dict(zip(result['patients']['Patient_Key'].tolist(), result['patients']['Name']))
+day_keys = [k for r in result['routes'] if r['date'] == day for _, keys in r['stops'] for k in keys]
+done = st.multiselect("ผู้ป่วยที่ทีมเยี่ยมแล้ว", day_keys, format_func=names.get)
+if st.button("บันทึกการเยี่ยม", disabled=not done):
+    planner.confirm_visits(result, done)
+    st.rerun()
+
+export_key = ['visit_plan', version, distances_version, teams, days, critical_only, locked_days, start.isoformat()]
+st.download_button(
+    "ดาวน์โหลดแผนทั้งหมด (CSV)",
+    data=export.on_demand(export_key, 'csv', lambda: export.frame_chunks(schedule_df), sheet='VisitPlan'),
+    file_name="visit_plan.csv",
+    mime=export.MIME['csv'],
+    on_click='ignore',
+)
+
+st.markdown("---")
+st.subheader("ผู้ป่วยที่เยี่ยมแล้ว")
+if visits.empty:
+    st.caption("ยังไม่มีการบันทึกการเยี่ยม")
+else:
+    st.dataframe(visits[['Name', 'Village', 'Date', 'Team', 'Recorded_At']].rename(columns={
+        'Name': 'ชื่อ-สกุล', 'Village': 'หมู่บ้าน', 'Date': 'วันที่เยี่ยม', 'Team': 'ทีม', 'Recorded_At': 'บันทึกเมื่อ'}),
+        use_container_width=True, hide_index=True)
+    visit_names = dict(zip(visits['Patient_Key'].tolist(), visits['Name']))
+    undo = st.multiselect("ยกเลิกการบันทึก (กลับเข้าแผน)", list(visit_names), format_func=visit_names.get)
+    if st.button("ยกเลิกการบันทึก", disabled=not undo):
+        planner.undo_visits(undo)
+        st.rerun()